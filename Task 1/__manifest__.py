@@ -13,9 +13,17 @@
     - Detects SO number dynamically (no hardcoded formats).
     - Handles partial payments, multiple invoices, and refunds.
     - Works for Journal Entries and Bank Statement Lines.
+    - Optional queued mode: posting only enqueues moves, a cron reconciles them.
+    - Resumable backfill of receivables posted before installation.
     """,
-    'depends': ['account', 'sale'],
-    'data': [],
+    'depends': ['account', 'sale', 'perf_instrumentation'],
+    'data': [
+        'security/ir.model.access.csv',
+        'data/ir_config_parameter.xml',
+        'data/ir_cron.xml',
+        'views/reconciliation_queue_view.xml',
+        'views/reconciliation_backfill_view.xml',
+    ],
     'installable': True,
     'application': False,
     'license': 'LGPL-3',
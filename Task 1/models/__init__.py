@@ -1 +1,4 @@
-from . import account_move
\ No newline at end of file
+from . import account_move
+from . import sale_order
+from . import reconciliation_queue
+from . import reconciliation_backfill
\ No newline at end of file
@@ -1,5 +1,6 @@
-import re
+import psycopg2
 from odoo import models, api, _
+from odoo.addons.perf_instrumentation.tools.instrument import measure
 
 class AccountMove(models.Model):
     _inherit = 'account.move'
@@ -12,79 +13,175 @@ class AccountMove(models.Model):
         # Call super to perform the standard posting logic
         posted = super(AccountMove, self)._post(soft=soft)
 
-        # Iterate through the posted moves to perform our custom logic
-        for move in self:
-            self._attempt_so_reconciliation(move)
+        # Overhead added to the posting, with the moves that failed to reconcile as errors.
+        with measure('payment_so_reconciliation.post', self.env, items=len(posted)) as sample:
+            # In queued mode, posting only records the moves to reconcile;
+            # the matching itself is done later by the queue cron.
+            if self.env['payment.so.reconciliation.queue']._is_queue_enabled():
+                self.env['payment.so.reconciliation.queue']._enqueue(posted)
+                return posted
+
+            # Process the whole batch at once: a bank statement import can post
+            # thousands of moves in a single call, so the lookups below must not
+            # be repeated move by move.
+            outcomes = posted._attempt_so_reconciliation_batch()
+            sample.errors += sum(1 for state, __ in outcomes.values() if state == 'failed')
+
+            # Moves whose invoices are being reconciled by another transaction are
+            # handed to the queue instead of waiting for (or failing on) the lock.
+            deferred_ids = [move_id for move_id, (state, __) in outcomes.items() if state == 'deferred']
+            if deferred_ids:
+                self.env['payment.so.reconciliation.queue']._enqueue(self.browse(deferred_ids))
 
         return posted
 
     def _attempt_so_reconciliation(self, move):
         """
-        Analyzes the first journal item's label to find a Sales Order reference
-        and reconciles the move with linked invoices.
+        Single-move entry point, kept for callers outside of _post.
         """
-        # Ensure the move has lines
-        if not move.line_ids:
-            return
-
-        # Requirement: "If the first journal Items>label contains a Sales Order (SO) number"
-        # We sort by sequence/id to ensure we get the "first" line consistently.
-        # In Odoo, the first line is often the one created first or top of the list.
-        sorted_lines = move.line_ids.sorted(lambda l: (l.sequence, l.id))
-        first_line = sorted_lines[0]
-        label = first_line.name
+        move._attempt_so_reconciliation_batch()
 
-        if not label:
-            return
+    def _attempt_so_reconciliation_batch(self):
+        """
+        Set-based version of the SO reconciliation for every move in self.
+        Returns {move id: (outcome, message)}, outcome being one of
+        'done', 'no_match', 'failed' or 'deferred' (invoices locked by
+        another transaction, to be retried later).
 
-        # 1. Detect Sales Order Number
+        The number of queries does not depend on the batch size:
+        1. SO names are found in all first-line labels by the in-memory matcher.
+        2. The matched Sales Orders are browsed, without any name search.
+        3. All open invoices and their receivable lines are loaded at once.
+        4. Each move is then reconciled against the lines of its own SOs.
+        """
+        # 1. Detect Sales Order Numbers in the label of the first journal item of every move.
+        # Requirement: "If the first journal Items>label contains a Sales Order (SO) number"
         # Constraint: "No Hardcode Sales Order number formats"
-        # Strategy: specific logic to extract potential SO names. 
-        # We split the label into words/tokens and check if any match an existing SO name.
-        # This avoids regex like r'SO\d+' and works for any sequence format (e.g., "SO/2024/001").
-        
-        # Split by common delimiters (space, comma, colon, etc.)
-        tokens = re.split(r'[\s,;:]+', label)
-        
-        # Filter out short tokens to reduce DB load (optional, but good for performance)
-        potential_refs = [t for t in tokens if len(t) > 2]
-        
-        if not potential_refs:
-            return
-
-        # Search for Sales Orders where the name matches any token found in the label.
-        # This respects the "No brute-force ORM loops" constraint by using a direct search.
-        sales_orders = self.env['sale.order'].search([('name', 'in', potential_refs)])
+        # The matcher knows every SO name of the company and finds them anywhere in the
+        # label (e.g. "PAY-SO/2024/001-bank"), so no format assumption is made.
+        outcomes = {move.id: ('no_match', False) for move in self}
+        matchers = {}
+        so_ids_by_move = {}
+        for move in self:
+            if not move.line_ids:
+                continue
+            # We sort by sequence/id to ensure we get the "first" line consistently.
+            first_line = move.line_ids.sorted(lambda l: (l.sequence, l.id))[0]
+            if not first_line.name:
+                continue
+            if move.company_id.id not in matchers:
+                matchers[move.company_id.id] = self.env['sale.order']._get_so_name_matcher(move.company_id.id)
+            found = matchers[move.company_id.id].find(first_line.name)
+            if found:
+                so_ids_by_move[move] = set(found.values())
+
+        if not so_ids_by_move:
+            return outcomes
 
+        # 2. Browse every Sales Order referenced in the batch.
+        # exists() drops orders the cache may still know but that were deleted meanwhile.
+        # Their order does not matter: overlapping names are settled by the matcher
+        # (longest name first) and the invoice lines are allocated by due date.
+        all_so_ids = set().union(*so_ids_by_move.values())
+        sales_orders = self.env['sale.order'].browse(sorted(all_so_ids)).exists()
         if not sales_orders:
-            return
+            return outcomes
+
+        # 3. Load the open receivable lines of all open invoices of these SOs in ONE query,
+        # ordered by due date for the allocation stage.
+        # Reading invoice_ids on the whole recordset computes it for all SOs together.
+        receivable_lines = self.env['account.move.line'].search([
+            ('move_id', 'in', sales_orders.invoice_ids.ids),
+            ('move_id.move_type', 'in', ['out_invoice', 'out_refund']),
+            ('move_id.payment_state', 'in', ['not_paid', 'partial']),
+            ('parent_state', '=', 'posted'),
+            ('account_type', '=', 'asset_receivable'),
+            ('reconciled', '=', False),
+        ], order='date_maturity, id')
+        if not receivable_lines:
+            return outcomes
+
+        # Claim the lines before reading them: lines locked by a concurrent
+        # reconciliation are skipped instead of waited for.
+        # A row updated by a transaction committed after ours started cannot be
+        # locked at all (serialization failure): the whole set is then deferred.
+        try:
+            with self.env.cr.savepoint():
+                claimed_lines = self._claim_invoice_lines(receivable_lines)
+        except psycopg2.errors.SerializationFailure:
+            claimed_lines = receivable_lines.browse()
+        contended_line_ids = set(receivable_lines.ids) - set(claimed_lines.ids)
 
-        # 2. Reconcile with Correct Customer Invoices
-        for so in sales_orders:
-            self._reconcile_move_with_so_invoices(move, so)
+        # Rank of each line in the due date order.
+        line_rank = {line_id: rank for rank, line_id in enumerate(receivable_lines.ids)}
+        line_ids_by_invoice = {}
+        for line in receivable_lines:
+            line_ids_by_invoice.setdefault(line.move_id.id, []).append(line.id)
+        line_ids_by_so = {
+            so.id: {
+                line_id
+                for inv_id in so.invoice_ids.ids
+                for line_id in line_ids_by_invoice.get(inv_id, [])
+            }
+            for so in sales_orders
+        }
 
-    def _reconcile_move_with_so_invoices(self, payment_move, so):
+        # 4. Allocate and reconcile each move against the invoices of the SOs found in its label.
+        for move, so_ids in so_ids_by_move.items():
+            line_ids = set().union(*(line_ids_by_so.get(so_id, set()) for so_id in so_ids))
+            if line_ids & contended_line_ids:
+                outcomes[move.id] = ('deferred', _("Invoices locked by another transaction."))
+            elif line_ids:
+                invoice_lines = receivable_lines.browse(sorted(line_ids, key=line_rank.get))
+                error = self._reconcile_move_with_so_invoices(move, invoice_lines)
+                outcomes[move.id] = ('failed', error) if error else ('done', False)
+
+        return outcomes
+
+    @api.model
+    def _claim_invoice_lines(self, lines):
         """
-        Finds open invoices related to the Sales Order and reconciles them with the payment move.
+        Locks the given invoice receivable lines and their invoices with
+        FOR UPDATE SKIP LOCKED and returns the lines that could be claimed.
+
+        A line is only claimed when both its invoice and itself are free, so
+        two workers never reconcile the same invoice at the same time and
+        neither of them blocks on the other.
         """
-        # Find related invoices that are posted and not fully paid.
-        # We look for 'out_invoice' (Customer Invoice) or 'out_refund' (Credit Note) depending on logic,
-        # usually payments reconcile against Invoices.
-        # constraint: "Multiple invoices generated from the same Sales Order" -> The loop handles this.
-        # constraint: "Refunds and credit notes" -> Included in the domain if necessary, 
-        # but typically we reconcile a Payment (Asset/Liability) against an Invoice (Receivable).
-        
-        domain = [
-            ('id', 'in', so.invoice_ids.ids),
-            ('move_type', 'in', ['out_invoice', 'out_refund']),
-            ('state', '=','posted'),
-            ('payment_state', 'in', ['not_paid', 'partial']),
-        ]
-        invoices = self.env['account.move'].search(domain)
-
-        if not invoices:
-            return
+        if not lines:
+            return lines
+        self.env.cr.execute("""
+            SELECT id
+              FROM account_move
+             WHERE id IN %s
+          ORDER BY id
+               FOR UPDATE SKIP LOCKED
+        """, (tuple(lines.move_id.ids),))
+        claimed_move_ids = [row[0] for row in self.env.cr.fetchall()]
+        if not claimed_move_ids:
+            return lines.browse()
+
+        self.env.cr.execute("""
+            SELECT id
+              FROM account_move_line
+             WHERE id IN %s
+               AND move_id IN %s
+          ORDER BY id
+               FOR UPDATE SKIP LOCKED
+        """, (tuple(lines.ids), tuple(claimed_move_ids)))
+        claimed_line_ids = {row[0] for row in self.env.cr.fetchall()}
 
+        # Read the residual amounts again now that the rows are ours.
+        lines.invalidate_recordset()
+        return lines.filtered(lambda l: l.id in claimed_line_ids)
+
+    def _reconcile_move_with_so_invoices(self, payment_move, invoice_lines):
+        """
+        Reconciles the payment move with the open receivable lines of its SO invoices.
+        invoice_lines must only contain receivable, unreconciled invoice lines,
+        ordered by due date.
+        Returns the error message of the first failed reconciliation, if any.
+        """
         # Identify the "Receivable" lines in the Payment Move (the one we just posted).
         # These are the lines we want to reconcile against the Invoice's receivable lines.
         # Using account_type='asset_receivable' ensures we get the partner ledger line.
@@ -93,42 +190,77 @@ class AccountMove(models.Model):
         )
 
         if not payment_lines:
-            return
-
-        for invoice in invoices:
-            # SAFETY CHECK: Refresh payment lines status.
-            # If the payment was fully used by the previous invoice in the loop, 
-            # we must stop to avoid "Already Reconciled" errors.
-            available_payment_lines = payment_lines.filtered(lambda l: not l.reconciled)
-            
-            if not available_payment_lines:
-                break
-
-            # Identify the "Receivable" lines in the Invoice.
-            invoice_lines = invoice.line_ids.filtered(
-                lambda l: l.account_type == 'asset_receivable' and not l.reconciled
-            )
-            
-            if not invoice_lines:
-                continue
+            return False
+
+        # The payment may reference an invoice it is part of; never reconcile a move with itself.
+        # Another move of the same batch may also have settled some of the lines already.
+        invoice_lines = invoice_lines.filtered(lambda l: l.move_id != payment_move and not l.reconciled)
 
+        error = False
+        for lines_to_reconcile in self._allocate_payment_lines(payment_lines, invoice_lines):
             # 3. Work seamlessly with existing Odoo reconciliation behavior
-            # We combine the lines and call the standard Odoo `reconcile()` method.
+            # We combine the lines and call the standard Odoo `reconcile()` method, ONCE per
+            # partner and account group, instead of once per invoice.
             # This handles:
             # - Partial payments (Odoo automatically calculates partials)
             # - Currency exchange (Odoo handles currency diffs)
             # - Status updates (changing invoice to 'in_payment' or 'paid')
-            
-            lines_to_reconcile = available_payment_lines + invoice_lines
-            
-            # We need at least one line from payment and one from invoice to reconcile
-            if len(lines_to_reconcile) < 2:
-                continue
-
+            # Each attempt runs in its own savepoint so that a failure leaves
+            # the rest of the transaction (and the other moves of the batch) usable.
             try:
-                lines_to_reconcile.reconcile()
+                with self.env.cr.savepoint():
+                    lines_to_reconcile.reconcile()
             except Exception as e:
-                # We catch errors to ensure one failed reconciliation doesn't rollback the entire 
+                # We catch errors to ensure one failed reconciliation doesn't rollback the entire
                 # payment posting (Constraint: "The solution must NOT Break... existing logic").
-                # In a real scenario, we might log this error.
-                pass
\ No newline at end of file
+                # The first error is reported to the caller (e.g. the queue records it and retries).
+                error = error or str(e)
+
+        return error
+
+    @api.model
+    def _allocate_payment_lines(self, payment_lines, invoice_lines):
+        """
+        Decides in Python which invoice lines each payment settles.
+
+        Lines are grouped by account and commercial partner. Within a group,
+        the invoice lines on the same side as the payment (e.g. credit notes
+        for an incoming payment) add to the amount to allocate, then the
+        opposite lines are taken by due date until that amount is used up.
+        Returns one recordset to reconcile per group.
+        """
+        groups = {}
+        for line in payment_lines:
+            key = (line.account_id.id, line.partner_id.commercial_partner_id.id)
+            groups.setdefault(key, self.env['account.move.line'])
+            groups[key] |= line
+
+        to_reconcile = []
+        for (account_id, partner_id), group_payment_lines in groups.items():
+            # A payment line without partner can settle the invoices of any partner.
+            candidates = invoice_lines.filtered(lambda l: l.account_id.id == account_id and (
+                not partner_id or l.partner_id.commercial_partner_id.id == partner_id
+            ))
+            currency = group_payment_lines.company_id.currency_id[:1]
+            remaining = sum(group_payment_lines.mapped('amount_residual'))
+            if not candidates or currency.is_zero(remaining):
+                continue
+            sign = 1 if remaining > 0 else -1
+
+            same_side = candidates.filtered(lambda l: l.amount_residual * sign > 0)
+            remaining += sum(same_side.mapped('amount_residual'))
+
+            selected = self.env['account.move.line']
+            for line in candidates - same_side:
+                if remaining * sign <= 0 or currency.is_zero(remaining):
+                    break
+                selected |= line
+                remaining += line.amount_residual
+
+            # Reconciling only same-side lines would settle nothing.
+            if selected:
+                to_reconcile.append(group_payment_lines + same_side + selected)
+            # Lines allocated here are no longer available for the next groups.
+            invoice_lines -= same_side + selected
+
+        return to_reconcile
@@ -0,0 +1,129 @@
+import logging
+import time
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+
+_logger = logging.getLogger(__name__)
+
+
+class ReconciliationBackfill(models.Model):
+    _name = 'payment.so.reconciliation.backfill'
+    _description = 'SO Payment Reconciliation Backfill'
+    _order = 'id desc'
+
+    name = fields.Char(string="Name", required=True, default=lambda self: _("Backfill"))
+    state = fields.Selection([
+        ('draft', 'Draft'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+    ], string="Status", default='draft', required=True)
+    page_size = fields.Integer(string="Page Size", default=1000, required=True)
+    time_budget = fields.Integer(
+        string="Time Budget (s)", default=240, required=True,
+        help="Maximum time spent per cron invocation. The run resumes from its checkpoint on the next one.",
+    )
+
+    # Checkpoint: the highest receivable line id already processed.
+    last_line_id = fields.Integer(string="Last Processed Line", default=0, readonly=True)
+    scanned_count = fields.Integer(string="Entries Scanned", default=0, readonly=True)
+    reconciled_count = fields.Integer(string="Entries Reconciled", default=0, readonly=True)
+    failed_count = fields.Integer(string="Entries Failed", default=0, readonly=True)
+    date_start = fields.Datetime(string="Started On", readonly=True)
+    date_end = fields.Datetime(string="Finished On", readonly=True)
+
+    def action_start(self):
+        self.filtered(lambda r: r.state == 'draft').write({
+            'state': 'running',
+            'date_start': fields.Datetime.now(),
+        })
+
+    def action_reset(self):
+        if self.filtered(lambda r: r.state == 'running'):
+            raise UserError(_("A running backfill cannot be reset."))
+        self.write({
+            'state': 'draft',
+            'last_line_id': 0,
+            'scanned_count': 0,
+            'reconciled_count': 0,
+            'failed_count': 0,
+            'date_start': False,
+            'date_end': False,
+        })
+
+    @api.model
+    def _cron_run_backfill(self):
+        for backfill in self.search([('state', '=', 'running')]):
+            backfill._run()
+
+    def _run(self):
+        """
+        Processes pages of open receivable lines until the time budget is
+        spent, committing the checkpoint after each page.
+        """
+        self.ensure_one()
+        started = time.monotonic()
+        while time.monotonic() - started < self.time_budget:
+            if not self._process_next_page():
+                self.write({'state': 'done', 'date_end': fields.Datetime.now()})
+                self.env.cr.commit()
+                break
+            self.env.cr.commit()
+
+    def _fetch_next_page(self):
+        """
+        Keyset pagination over the open receivable lines of posted journal
+        entries: each page starts right after the checkpoint, so no OFFSET
+        scan is needed however deep the run is.
+        Returns (last line id of the page, move ids of the page).
+        """
+        self.env['account.move.line'].flush_model(['account_type', 'reconciled', 'parent_state', 'move_id'])
+        self.env.cr.execute("""
+            SELECT line.id, line.move_id
+              FROM account_move_line line
+              JOIN account_move move ON move.id = line.move_id
+             WHERE line.id > %s
+               AND line.account_type = 'asset_receivable'
+               AND line.reconciled IS NOT TRUE
+               AND line.parent_state = 'posted'
+               AND move.move_type = 'entry'
+          ORDER BY line.id
+             LIMIT %s
+        """, (self.last_line_id, self.page_size))
+        rows = self.env.cr.fetchall()
+        if not rows:
+            return 0, []
+        return rows[-1][0], list(dict.fromkeys(move_id for __, move_id in rows))
+
+    def _process_next_page(self):
+        """
+        Runs the batched SO matching on the entries of the next page and
+        moves the checkpoint forward. Returns False when nothing is left.
+        """
+        last_line_id, move_ids = self._fetch_next_page()
+        if not move_ids:
+            return False
+
+        moves = self.env['account.move'].browse(move_ids)
+        try:
+            with self.env.cr.savepoint():
+                outcomes = moves._attempt_so_reconciliation_batch()
+        except Exception as e:
+            _logger.exception("SO reconciliation backfill failed on page ending at line %s", last_line_id)
+            outcomes = {move_id: ('failed', str(e)) for move_id in move_ids}
+
+        # Entries whose invoices are locked by a concurrent reconciliation are
+        # handed to the queue, as the checkpoint moves past them.
+        deferred_ids = [move_id for move_id, (state, __) in outcomes.items() if state == 'deferred']
+        if deferred_ids:
+            self.env['payment.so.reconciliation.queue']._enqueue(moves.browse(deferred_ids))
+
+        states = [state for state, __ in outcomes.values()]
+        self.write({
+            'last_line_id': last_line_id,
+            'scanned_count': self.scanned_count + len(move_ids),
+            'reconciled_count': self.reconciled_count + states.count('done'),
+            'failed_count': self.failed_count + states.count('failed'),
+        })
+        # Free the memory of the page before loading the next one.
+        self.env.invalidate_all()
+        return True
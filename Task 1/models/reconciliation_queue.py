@@ -0,0 +1,130 @@
+import logging
+import time
+from datetime import timedelta
+from odoo import models, fields, api
+
+_logger = logging.getLogger(__name__)
+
+
+class ReconciliationQueue(models.Model):
+    _name = 'payment.so.reconciliation.queue'
+    _description = 'Pending SO Payment Reconciliation'
+    _order = 'next_attempt_date, id'
+
+    move_id = fields.Many2one('account.move', string="Journal Entry", required=True, index=True, ondelete='cascade')
+    state = fields.Selection([
+        ('pending', 'Pending'),
+        ('done', 'Reconciled'),
+        ('no_match', 'No Match'),
+        ('failed', 'Failed'),
+    ], string="Status", default='pending', required=True, index=True)
+    attempt_count = fields.Integer(string="Attempts", default=0)
+    next_attempt_date = fields.Datetime(string="Next Attempt", default=fields.Datetime.now, index=True)
+    processed_date = fields.Datetime(string="Processed On")
+    message = fields.Text(string="Message")
+
+    # At most one pending entry per move: a move posted again, or deferred by the
+    # backfill while already queued, is reconciled once.
+    _move_pending_uniq = models.UniqueIndex("(move_id) WHERE state = 'pending'")
+
+    @api.model
+    def _get_param(self, key, default):
+        return self.env['ir.config_parameter'].sudo().get_param('payment_so_reconciliation.%s' % key, default)
+
+    @api.model
+    def _is_queue_enabled(self):
+        return self._get_param('mode', 'sync') == 'queued'
+
+    @api.model
+    def _enqueue(self, moves):
+        """
+        Records the moves to reconcile later. Only moves with an open
+        receivable line can be matched, so the others are not queued, nor
+        are the moves that already have a pending entry.
+        """
+        moves = moves.filtered(lambda m: any(
+            l.account_type == 'asset_receivable' and not l.reconciled for l in m.line_ids
+        ))
+        if moves:
+            moves -= self.sudo().search([('move_id', 'in', moves.ids), ('state', '=', 'pending')]).move_id
+        if moves:
+            self.sudo().create([{'move_id': move.id} for move in moves])
+
+    @api.model
+    def _cron_process_queue(self):
+        """
+        Drains the pending entries in chunks, committing after each chunk.
+        Failed entries are retried with an exponential backoff until
+        'max_attempts' is reached.
+        """
+        chunk_size = int(self._get_param('queue_chunk_size', 200))
+        time_limit = int(self._get_param('queue_time_limit', 240))
+        started = time.monotonic()
+
+        while time.monotonic() - started < time_limit:
+            entries = self.search([
+                ('state', '=', 'pending'),
+                ('next_attempt_date', '<=', fields.Datetime.now()),
+            ], limit=chunk_size)
+            if not entries:
+                break
+            entries._process()
+            self.env.cr.commit()
+
+    def _process(self):
+        """
+        Runs the batched reconciliation for the moves of these entries and
+        records the outcome of each of them.
+        """
+        max_attempts = int(self._get_param('queue_max_attempts', 5))
+        retry_delay = int(self._get_param('queue_retry_delay', 5))
+        now = fields.Datetime.now()
+
+        entries = self.filtered(lambda e: e.move_id.state == 'posted')
+        (self - entries).write({'state': 'no_match', 'processed_date': now, 'message': "Entry is no longer posted."})
+
+        try:
+            with self.env.cr.savepoint():
+                outcomes = entries.move_id._attempt_so_reconciliation_batch()
+        except Exception as e:
+            _logger.exception("SO reconciliation of queued moves failed")
+            outcomes = {move.id: ('failed', str(e)) for move in entries.move_id}
+
+        # Group the writes by outcome to keep one UPDATE per state.
+        to_write = {}
+        for entry in entries:
+            state, message = outcomes.get(entry.move_id.id, ('no_match', False))
+            if state == 'deferred':
+                # Contention is not a failure: retry soon, without consuming an attempt.
+                vals = {'next_attempt_date': now + timedelta(minutes=1), 'message': message}
+            else:
+                attempt_count = entry.attempt_count + 1
+                vals = {'attempt_count': attempt_count, 'message': message or False}
+                if state == 'failed' and attempt_count < max_attempts:
+                    vals.update(
+                        state='pending',
+                        next_attempt_date=now + timedelta(minutes=retry_delay * 2 ** (attempt_count - 1)),
+                    )
+                else:
+                    vals.update(state=state, processed_date=now)
+            key = tuple(sorted(vals.items()))
+            to_write[key] = to_write.get(key, self.browse()) | entry
+        for vals, records in to_write.items():
+            records.write(dict(vals))
+
+    def action_retry(self):
+        # The moves queued again since are left to their pending entry.
+        pending = self.search([('move_id', 'in', self.move_id.ids), ('state', '=', 'pending')])
+        self.filtered(lambda e: e.move_id not in pending.move_id).write({
+            'state': 'pending',
+            'next_attempt_date': fields.Datetime.now(),
+        })
+
+    @api.autovacuum
+    def _gc_processed_entries(self):
+        """Removes the entries processed more than 30 days ago."""
+        limit_date = fields.Datetime.now() - timedelta(days=30)
+        self.search([
+            ('state', 'in', ['done', 'no_match']),
+            ('processed_date', '<', limit_date),
+        ]).unlink()
@@ -0,0 +1,181 @@
+import threading
+import time
+from datetime import timedelta
+from odoo import models, api, SUPERUSER_ID
+
+from ..tools import so_name_matcher
+
+# Orders that may still receive a payment to reconcile: confirmed, and not yet
+# fully invoiced or with an invoice still open.
+_MATCHABLE_SO_SQL = """
+    so.state = 'sale'
+    AND (
+        so.invoice_status != 'invoiced'
+        OR EXISTS (
+            SELECT 1
+              FROM sale_order_line sol
+              JOIN sale_order_line_invoice_rel rel ON rel.order_line_id = sol.id
+              JOIN account_move_line aml ON aml.id = rel.invoice_line_id
+              JOIN account_move am ON am.id = aml.move_id
+             WHERE sol.order_id = so.id
+               AND am.state = 'posted'
+               AND am.payment_state IN ('not_paid', 'partial')
+        )
+    )
+"""
+
+
+class SaleOrder(models.Model):
+    _inherit = 'sale.order'
+
+    # Orders written since the last look of the matcher (see _refresh_so_name_matcher).
+    _so_name_matcher_idx = models.Index('(company_id, write_date)')
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        orders = super(SaleOrder, self).create(vals_list)
+        orders._update_so_name_matchers()
+        return orders
+
+    def write(self, vals):
+        # Only a rename, a company change or a state change (e.g. confirm, cancel) may alter the matcher.
+        if not {'name', 'state', 'company_id'} & set(vals):
+            return super(SaleOrder, self).write(vals)
+
+        before = {order.id: order._get_so_name_matcher_entry() for order in self}
+        res = super(SaleOrder, self).write(vals)
+        # e.g. sending a quotation changes the state but leaves the order unmatched.
+        changed = self.filtered(lambda order: order._get_so_name_matcher_entry() != before[order.id])
+        changed._update_so_name_matchers(removed=[before[order.id] for order in changed if before[order.id]])
+        return res
+
+    def unlink(self):
+        removed = [entry for entry in (order._get_so_name_matcher_entry() for order in self) if entry]
+        res = super(SaleOrder, self).unlink()
+        self.browse()._update_so_name_matchers(removed=removed)
+        return res
+
+    def _get_so_name_matcher_entry(self):
+        """(company id, name) under which the order is matched, None unless it is confirmed."""
+        return (self.company_id.id, self.name) if self.state == 'sale' else None
+
+    def _update_so_name_matchers(self, removed=()):
+        """
+        Records the matcher changes of the current transaction. The matchers
+        returned to this transaction see them at once; the matchers of the
+        worker only get them after commit, so a rolled back transaction never
+        reaches the cache.
+        """
+        added = [order for order in self if order._get_so_name_matcher_entry()]
+        if not (added or removed):
+            return
+        pending = so_name_matcher.get_pending(self.env.cr, create=True)
+        for company_id, name in removed:
+            added_names, removed_names = pending.setdefault(company_id, ({}, set()))
+            added_names.pop(name, None)
+            removed_names.add(name)
+        for order in added:
+            added_names, removed_names = pending.setdefault(order.company_id.id, ({}, set()))
+            added_names[order.name] = order.id
+            removed_names.discard(order.name)
+
+    @api.model
+    def _get_so_name_matcher(self, company_id):
+        """
+        Returns the SO name matcher of the given company: the open Sales Orders
+        (confirmed, not fully invoiced and paid), cached per registry for the
+        whole worker, with the uncommitted changes of this transaction on top.
+
+        The cached matcher only holds committed data. Orders written by other
+        transactions are picked up with one indexed query on write_date; the
+        orders that are no longer open are dropped when the matcher expires
+        (payment_so_reconciliation.matcher_ttl, in seconds) and is rebuilt in
+        the background. Only the very first build of the worker is made while
+        posting.
+        """
+        dbname = self.env.cr.dbname
+        matcher = so_name_matcher.get_matcher(dbname, company_id)
+        if matcher is None:
+            # A new cursor only sees committed orders.
+            with self.env.registry.cursor() as cr:
+                matcher = self.with_env(self.env(cr=cr))._build_so_name_matcher(company_id)
+            so_name_matcher.set_matcher(dbname, company_id, matcher)
+        else:
+            ttl = int(self._get_so_name_matcher_param('matcher_ttl', 300))
+            if time.monotonic() - matcher.built_at > ttl:
+                self._rebuild_so_name_matcher(company_id)
+            self._refresh_so_name_matcher(matcher, company_id)
+
+        pending = (so_name_matcher.get_pending(self.env.cr) or {}).get(company_id)
+        return so_name_matcher.TransactionMatcher(matcher, *pending) if pending else matcher
+
+    @api.model
+    def _get_so_name_matcher_param(self, key, default):
+        return self.env['ir.config_parameter'].sudo().get_param('payment_so_reconciliation.%s' % key, default)
+
+    @api.model
+    def _build_so_name_matcher(self, company_id):
+        """
+        Builds the matcher of a company, automaton included. Runs on a
+        cursor of its own, which does not see uncommitted orders.
+        """
+        matcher = so_name_matcher.SoNameMatcher(
+            self._read_matchable_so_names(company_id), watermark=self.env.cr.now(),
+        )
+        matcher.build()
+        return matcher
+
+    @api.model
+    def _rebuild_so_name_matcher(self, company_id):
+        """Replaces the expired matcher of a company in a background thread (synchronously in tests)."""
+        registry = self.env.registry
+
+        def build():
+            with registry.cursor() as cr:
+                return api.Environment(cr, SUPERUSER_ID, {})['sale.order']._build_so_name_matcher(company_id)
+
+        if getattr(threading.current_thread(), 'testing', False):
+            so_name_matcher.set_matcher(self.env.cr.dbname, company_id, build())
+        else:
+            so_name_matcher.rebuild_in_background(self.env.cr.dbname, company_id, build)
+
+    @api.model
+    def _refresh_so_name_matcher(self, matcher, company_id):
+        """
+        Applies to the matcher the orders of the company committed since its
+        watermark. The rows written by the current transaction (their
+        write_date is its now()) are not committed yet: they are left to the
+        postcommit update.
+
+        write_date is the start of the writing transaction, not its commit:
+        the window is extended by payment_so_reconciliation.matcher_margin
+        seconds so that the transactions committed meanwhile are not missed.
+        """
+        margin = int(self._get_so_name_matcher_param('matcher_margin', 60))
+        now = self.env.cr.now()
+        self.env.cr.execute("""
+            SELECT so.name, so.id, %s
+              FROM sale_order so
+             WHERE so.company_id = %%s
+               AND so.write_date >= %%s
+               AND so.write_date != %%s
+        """ % _MATCHABLE_SO_SQL, (company_id, matcher.watermark - timedelta(seconds=margin), now))
+        for name, so_id, matchable in self.env.cr.fetchall():
+            if matchable:
+                matcher.add(name, so_id)
+            else:
+                matcher.discard(name, so_id)
+        matcher.watermark = max(matcher.watermark, now)
+
+    @api.model
+    def _read_matchable_so_names(self, company_id):
+        """
+        Returns {name: id} of the open Sales Orders of a company.
+        """
+        self.env.cr.execute("""
+            SELECT so.name, so.id
+              FROM sale_order so
+             WHERE so.company_id = %%s
+               AND %s
+        """ % _MATCHABLE_SO_SQL, (company_id,))
+        return dict(self.env.cr.fetchall())
@@ -0,0 +1 @@
+from . import test_reconciliation_budget
@@ -0,0 +1,30 @@
+from odoo.tests import tagged
+
+from odoo.addons.account.tests.common import AccountTestInvoicingCommon
+
+from ..tools.reconciliation_benchmark import run_benchmark
+
+
+@tagged('post_install', '-at_install')
+class TestReconciliationQueryBudget(AccountTestInvoicingCommon):
+    """
+    Query budget of the SO reconciliation hook: posts two statement sizes
+    and fails on an N+1 regression in _attempt_so_reconciliation_batch.
+    """
+
+    # SQL queries per posted move spent by the hook outside of reconcile().
+    QUERY_BUDGET = 15
+
+    def test_query_budget_per_move(self):
+        small, large = run_benchmark(self.env, sizes=(5, 25), invoices_per_so=3, refunds_per_so=1, query_budget=None)
+
+        for result in (small, large):
+            self.assertLessEqual(
+                result['hook_queries_per_move'], self.QUERY_BUDGET,
+                "%(moves)s moves: %(hook_queries_per_move).1f queries per move in the hook" % result,
+            )
+            # The payments were matched, otherwise the budget measures nothing.
+            self.assertTrue(result['reconcile_calls'])
+
+        # Set-based lookups: five times more moves must not cost more queries per move.
+        self.assertLessEqual(large['hook_queries_per_move'], small['hook_queries_per_move'])
@@ -0,0 +1 @@
+from . import so_name_matcher
\ No newline at end of file
@@ -0,0 +1,204 @@
+"""
+Benchmark and query-count budget for the SO payment reconciliation.
+
+Generates synthetic Sales Orders, invoices, credit notes and a bank
+statement, posts the statement through AccountMove._post and measures the
+cost of the reconciliation hook. Everything runs inside a savepoint that is
+rolled back at the end, so it can be run on a copy of production data:
+
+    $ odoo-bin shell -d <database>
+    >>> from odoo.addons.payment_so_reconciliation.tools.reconciliation_benchmark import run_benchmark
+    >>> run_benchmark(env, sizes=(100, 1000), query_budget=15)
+
+The same measures back the query budget test (tests/test_reconciliation_budget.py).
+"""
+import logging
+import time
+from unittest.mock import patch
+
+from odoo import fields, _
+from odoo.exceptions import UserError
+
+from . import so_name_matcher
+
+_logger = logging.getLogger(__name__)
+
+
+class _Rollback(Exception):
+    pass
+
+
+def run_benchmark(env, sizes=(100,), invoices_per_so=3, refunds_per_so=1, query_budget=15):
+    """
+    Runs one benchmark per statement size and returns the list of results.
+
+    query_budget is the maximum number of SQL queries per posted move spent
+    by the reconciliation hook (_attempt_so_reconciliation_batch) outside of
+    reconcile() itself, i.e. by the matching, loading and allocation stages;
+    the core posting is not counted. It catches N+1 regressions: this number
+    must stay flat when the statement grows. A UserError is raised when it is
+    exceeded; None only reports the measures.
+    """
+    results = []
+    for size in sizes:
+        try:
+            with env.cr.savepoint():
+                results.append(_run_once(env, size, invoices_per_so, refunds_per_so))
+                raise _Rollback()
+        except _Rollback:
+            pass
+        finally:
+            # The rolled back orders must not reach the matchers when the transaction is committed.
+            (so_name_matcher.get_pending(env.cr) or {}).clear()
+            so_name_matcher.clear_matchers(env.cr.dbname)
+
+    for result in results:
+        _logger.info(
+            "SO reconciliation benchmark: %(moves)s moves in %(wall_time).2fs, "
+            "%(queries_per_move).1f queries/move (%(hook_queries_per_move).1f in the hook outside reconcile), "
+            "%(reconcile_calls)s reconcile calls", result,
+        )
+
+    over_budget = [r for r in results if query_budget is not None and r['hook_queries_per_move'] > query_budget]
+    if over_budget:
+        raise UserError(_(
+            "SO reconciliation uses %(queries).1f queries per move in the hook, outside reconcile(), "
+            "for %(moves)s moves (budget: %(budget)s)."
+        ) % {
+            'queries': over_budget[0]['hook_queries_per_move'],
+            'moves': over_budget[0]['moves'],
+            'budget': query_budget,
+        })
+    return results
+
+
+def _run_once(env, statement_size, invoices_per_so, refunds_per_so):
+    env['ir.config_parameter'].sudo().set_param('payment_so_reconciliation.mode', 'sync')
+    payments = _generate_dataset(env, statement_size, invoices_per_so, refunds_per_so)
+    env.flush_all()
+
+    AccountMove = type(env['account.move'])
+    AccountMoveLine = type(env['account.move.line'])
+    original_hook = AccountMove._attempt_so_reconciliation_batch
+    original_reconcile = AccountMoveLine.reconcile
+    hook_stats = {'queries': 0}
+    reconcile_stats = {'calls': 0, 'queries': 0}
+
+    def attempt_so_reconciliation_batch(self, *args, **kwargs):
+        # Only the matching stage is counted, not the core posting around it:
+        # the pending writes of the posting are flushed before, those of the hook after.
+        self.env.flush_all()
+        queries_before = self.env.cr.sql_log_count
+        try:
+            result = original_hook(self, *args, **kwargs)
+            self.env.flush_all()
+            return result
+        finally:
+            hook_stats['queries'] += self.env.cr.sql_log_count - queries_before
+
+    def reconcile(self, *args, **kwargs):
+        reconcile_stats['calls'] += 1
+        queries_before = self.env.cr.sql_log_count
+        try:
+            return original_reconcile(self, *args, **kwargs)
+        finally:
+            reconcile_stats['queries'] += self.env.cr.sql_log_count - queries_before
+
+    with patch.object(AccountMove, '_attempt_so_reconciliation_batch', attempt_so_reconciliation_batch), \
+            patch.object(AccountMoveLine, 'reconcile', reconcile):
+        queries_before = env.cr.sql_log_count
+        started = time.perf_counter()
+        payments._post()
+        env.flush_all()
+        wall_time = time.perf_counter() - started
+        queries = env.cr.sql_log_count - queries_before
+
+    moves = len(payments)
+    return {
+        'moves': moves,
+        'wall_time': wall_time,
+        'queries': queries,
+        'queries_per_move': queries / moves,
+        'hook_queries': hook_stats['queries'] - reconcile_stats['queries'],
+        'hook_queries_per_move': (hook_stats['queries'] - reconcile_stats['queries']) / moves,
+        'reconcile_calls': reconcile_stats['calls'],
+        'reconcile_calls_per_move': reconcile_stats['calls'] / moves,
+    }
+
+
+def _generate_dataset(env, statement_size, invoices_per_so, refunds_per_so):
+    """
+    Creates one confirmed SO per statement line, invoices_per_so posted
+    invoices and refunds_per_so posted credit notes per SO, and returns the
+    draft bank statement moves paying them (one move per SO).
+    """
+    company = env.company
+    journal = env['account.journal'].search([
+        ('type', '=', 'bank'),
+        ('company_id', '=', company.id),
+    ], limit=1)
+    if not journal:
+        raise UserError(_("The benchmark needs a bank journal in company %s.") % company.name)
+
+    partner = env['res.partner'].create({'name': 'SO Reconciliation Benchmark'})
+    product = env['product.product'].create({
+        'name': 'SO Reconciliation Benchmark',
+        'type': 'service',
+        'invoice_policy': 'order',
+        'list_price': 100.0,
+        'taxes_id': [(5, 0, 0)],
+    })
+
+    orders = env['sale.order'].create([{
+        'partner_id': partner.id,
+        'order_line': [
+            (0, 0, {'product_id': product.id, 'product_uom_qty': 1, 'price_unit': 100.0})
+            for __ in range(invoices_per_so)
+        ],
+    } for __ in range(statement_size)])
+    orders.action_confirm()
+
+    def invoice_vals(move_type, so_line, amount):
+        return {
+            'move_type': move_type,
+            'partner_id': partner.id,
+            'invoice_date': fields.Date.today(),
+            'invoice_line_ids': [(0, 0, {
+                'product_id': product.id,
+                'quantity': 1,
+                'price_unit': amount,
+                'sale_line_ids': [(6, 0, so_line.ids)],
+            })],
+        }
+
+    invoice_vals_list = []
+    for order in orders:
+        for so_line in order.order_line:
+            invoice_vals_list.append(invoice_vals('out_invoice', so_line, 100.0))
+        for so_line in order.order_line[:refunds_per_so]:
+            invoice_vals_list.append(invoice_vals('out_refund', so_line, 10.0))
+    env['account.move'].create(invoice_vals_list).action_post()
+
+    # Each payment covers all invoices of its SO minus the credit notes, less 5.0
+    # so that the last invoice stays partially paid.
+    receivable_account = partner.property_account_receivable_id
+    amount = 100.0 * invoices_per_so - 10.0 * min(refunds_per_so, invoices_per_so) - 5.0
+    return env['account.move'].create([{
+        'move_type': 'entry',
+        'journal_id': journal.id,
+        'date': fields.Date.today(),
+        'line_ids': [
+            (0, 0, {
+                'name': 'Payment for %s' % order.name,
+                'account_id': receivable_account.id,
+                'partner_id': partner.id,
+                'credit': amount,
+            }),
+            (0, 0, {
+                'name': 'Payment for %s' % order.name,
+                'account_id': journal.default_account_id.id,
+                'partner_id': partner.id,
+                'debit': amount,
+            }),
+        ],
+    } for order in orders])
@@ -0,0 +1,275 @@
+import logging
+import threading
+import time
+from collections import deque
+from functools import partial
+
+_logger = logging.getLogger(__name__)
+
+
+class _Automaton:
+    """Aho-Corasick automaton over a fixed {name: sale.order id}."""
+
+    def __init__(self, names):
+        self.names = names
+        goto, output = [{}], [[]]
+        for name, so_id in names.items():
+            state = 0
+            for char in name:
+                next_state = goto[state].get(char)
+                if next_state is None:
+                    goto.append({})
+                    output.append([])
+                    next_state = goto[state][char] = len(goto) - 1
+                state = next_state
+            output[state].append((name, so_id))
+
+        # Breadth-first computation of the failure links.
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in goto[state].items():
+                queue.append(next_state)
+                fallback = fail[state]
+                while fallback and char not in goto[fallback]:
+                    fallback = fail[fallback]
+                fail[next_state] = goto[fallback].get(char, 0)
+                output[next_state] = output[next_state] + output[fail[next_state]]
+
+        self._goto, self._fail, self._output = goto, fail, output
+
+    def find(self, text):
+        """
+        Returns {name: sale.order id} for every name found in text.
+
+        A match only counts when it is not surrounded by other letters or
+        digits, so "S0001" is not reported inside "S00012".
+        """
+        goto, fail, output = self._goto, self._fail, self._output
+        found = {}
+        state = 0
+        for index, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for name, so_id in output[state]:
+                if _is_delimited(text, index - len(name) + 1, name):
+                    found[name] = so_id
+        return found
+
+
+def _is_delimited(text, start, name):
+    """Whether the occurrence of name at start is not glued to other letters or digits."""
+    if start > 0 and text[start - 1].isalnum() and name[0].isalnum():
+        return False
+    end = start + len(name)
+    return not (end < len(text) and text[end].isalnum() and name[-1].isalnum())
+
+
+def _longest_matches(text, found):
+    """
+    Tie-break of overlapping names: a name is dropped when all its occurrences
+    lie inside a longer name found in text, e.g. "SO1" inside "SO1-B" only
+    matches SO1-B.
+    """
+    if len(found) < 2:
+        return found
+    spans = {}
+    for name in found:
+        start = text.find(name)
+        while start != -1:
+            if _is_delimited(text, start, name):
+                spans.setdefault(name, []).append((start, start + len(name)))
+            start = text.find(name, start + 1)
+    longer = sorted(spans, key=len, reverse=True)
+
+    def nested(name, start, end):
+        return any(
+            other_start <= start and end <= other_end
+            for other in longer if len(other) > len(name)
+            for other_start, other_end in spans[other]
+        )
+
+    return {
+        name: so_id for name, so_id in found.items()
+        if not all(nested(name, start, end) for start, end in spans.get(name, []))
+    }
+
+
+class SoNameMatcher:
+    """
+    Aho-Corasick matcher over Sales Order names.
+
+    Finds every known SO name inside a label in a single linear scan,
+    including references glued to other text (e.g. "PAY-SO/2024/001-bank").
+
+    The main automaton is built once from the names given at creation, and
+    only rebuilt when the matcher expires (a new matcher is created). Names
+    added afterwards go to a small secondary automaton, rebuilt on change;
+    removed names are filtered out of the matches of the main one.
+    """
+
+    def __init__(self, names=None, watermark=None):
+        # name -> sale.order id, as of the build of the main automaton
+        self._names = dict(names or {})
+        # Database time of the read of the names: the orders written since then are read again.
+        self.watermark = watermark
+        self.built_at = time.monotonic()
+        self._lock = threading.Lock()
+        self._main = None
+        # Names added or moved to another order since then; they take precedence over the main automaton.
+        self._added = {}
+        self._secondary = None
+        # Names of the main automaton that no longer match (replaced, never mutated, so find() needs no lock).
+        self._removed = frozenset()
+
+    def build(self):
+        """Builds the main automaton now, instead of on the first find()."""
+        with self._lock:
+            if self._main is None:
+                self._main = _Automaton(self._names)
+
+    def add(self, name, so_id):
+        if not name:
+            return
+        with self._lock:
+            if name in self._removed:
+                self._removed = self._removed - {name}
+            if self._names.get(name) == so_id and name not in self._added:
+                # Already matched by the main automaton.
+                return
+            if self._added.get(name) != so_id:
+                self._added[name] = so_id
+                self._secondary = None
+
+    def discard(self, name, so_id=None):
+        """Stops matching name; with so_id, only when name still matches that order."""
+        with self._lock:
+            if so_id is not None and self._get(name) != so_id:
+                return
+            if self._added.pop(name, None) is not None:
+                self._secondary = None
+            if name in self._names and name not in self._removed:
+                self._removed = self._removed | {name}
+
+    def _get(self, name):
+        if name in self._added:
+            return self._added[name]
+        return None if name in self._removed else self._names.get(name)
+
+    def find(self, text):
+        """Returns {name: sale.order id} for every SO name found in text."""
+        if not text:
+            return {}
+        with self._lock:
+            if self._main is None:
+                self._main = _Automaton(self._names)
+            if self._secondary is None:
+                self._secondary = _Automaton(dict(self._added))
+            main, secondary, removed = self._main, self._secondary, self._removed
+
+        found = {
+            name: so_id for name, so_id in main.find(text).items()
+            if name not in removed and name not in secondary.names
+        } if main.names else {}
+        if secondary.names:
+            found.update(secondary.find(text))
+        return _longest_matches(text, found)
+
+
+class TransactionMatcher:
+    """
+    Matcher seen by one transaction: the shared matcher, which only knows
+    committed orders, with the uncommitted changes of the transaction on top.
+    """
+
+    def __init__(self, matcher, added, removed):
+        self._matcher = matcher
+        self._added = _Automaton(dict(added))
+        self._removed = frozenset(removed)
+
+    def find(self, text):
+        if not text:
+            return {}
+        found = {
+            name: so_id for name, so_id in self._matcher.find(text).items()
+            if name not in self._removed and name not in self._added.names
+        }
+        if self._added.names:
+            found.update(self._added.find(text))
+        return _longest_matches(text, found)
+
+
+# Matchers are kept per registry (database) and per company for the lifetime
+# of the worker process.
+_matchers = {}
+_matchers_lock = threading.RLock()
+# (dbname, company_id) of the matchers being rebuilt in the background.
+_rebuilding = set()
+
+_PENDING_KEY = 'payment_so_reconciliation.so_name_matcher'
+
+
+def get_matcher(dbname, company_id):
+    with _matchers_lock:
+        return _matchers.get((dbname, company_id))
+
+
+def set_matcher(dbname, company_id, matcher):
+    with _matchers_lock:
+        _matchers[(dbname, company_id)] = matcher
+
+
+def rebuild_in_background(dbname, company_id, build):
+    """
+    Replaces the matcher of (dbname, company_id) by build() in a background
+    thread; the current matcher keeps serving until then. A rebuild already
+    running for the same matcher is not started twice.
+    """
+    key = (dbname, company_id)
+    with _matchers_lock:
+        if key in _rebuilding:
+            return
+        _rebuilding.add(key)
+
+    def run():
+        try:
+            set_matcher(dbname, company_id, build())
+        except Exception:
+            _logger.exception("Rebuild of the SO name matcher of company %s failed", company_id)
+        finally:
+            with _matchers_lock:
+                _rebuilding.discard(key)
+
+    threading.Thread(target=run, name='so_name_matcher', daemon=True).start()
+
+
+def get_pending(cr, create=False):
+    """
+    Matcher changes of the current transaction of cr, {company_id: ({name:
+    so_id} added, {name} removed)}. They are applied to the matchers of the
+    worker when the transaction is committed, and dropped on rollback.
+    """
+    pending = cr.postcommit.data.get(_PENDING_KEY)
+    if pending is None and create:
+        pending = cr.postcommit.data[_PENDING_KEY] = {}
+        cr.postcommit.add(partial(_apply_pending, cr.dbname, pending))
+    return pending
+
+
+def _apply_pending(dbname, pending):
+    with _matchers_lock:
+        for company_id, (added, removed) in pending.items():
+            matcher = _matchers.get((dbname, company_id))
+            if matcher:
+                for name in removed:
+                    matcher.discard(name)
+                for name, so_id in added.items():
+                    matcher.add(name, so_id)
+
+
+def clear_matchers(dbname):
+    with _matchers_lock:
+        for key in [key for key in _matchers if key[0] == dbname]:
+            del _matchers[key]
@@ -1,2 +1,2 @@
-
-from . import wizard
\ No newline at end of file
+from . import models
+from . import wizard
@@ -13,7 +13,7 @@
     - Updates the password securely.
     - Logs the user out immediately after success.
     """,
-    'depends': ['web', 'base'],
+    'depends': ['web', 'base', 'perf_instrumentation'],
     'data': [
         'security/ir.model.access.csv',
         'wizard/change_password_wizard_view.xml',
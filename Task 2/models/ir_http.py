@@ -0,0 +1,15 @@
+from odoo import models
+
+
+class IrHttp(models.AbstractModel):
+    _inherit = 'ir.http'
+
+    def session_info(self):
+        """
+        Ships the Change Password action with the session, so the user menu
+        opens the wizard without loading the action from the server first.
+        """
+        result = super().session_info()
+        if self.env.user._is_internal():
+            result['change_password_action'] = self.env['user.change.password.wizard']._get_action()
+        return result
@@ -1,31 +1,69 @@
 /** @odoo-module **/
 
+import { makeContext } from "@web/core/context";
 import { registry } from "@web/core/registry";
+import { user } from "@web/core/user";
 import { _t } from "@web/core/l10n/translation";
+import { session } from "@web/session";
 
 // We access the standard user_menuitems registry
 const userMenuRegistry = registry.category("user_menuitems");
 
+const ACTION_XMLID = "user_password_menu.action_user_change_password_wizard";
+
+// The view service keeps the view descriptions for the page: they are requested
+// once, so opening the wizard needs no extra RPC.
+let viewsPrefetched = false;
+
+function getChangePasswordAction() {
+    // Server-defined action shipped with the session (see ir.http.session_info)
+    const action = session.change_password_action;
+    // doAction may alter the action: always hand over a copy
+    return action && { ...action, views: action.views.map((view) => [...view]) };
+}
+
+function prefetchViews(env, action) {
+    if (viewsPrefetched) {
+        return;
+    }
+    viewsPrefetched = true;
+    // Same request as the action service for a target "new" action, so that doAction
+    // hits the view service cache: _for_xml_id returns the context as a string, it
+    // must be evaluated the way doAction does it.
+    const searchViewId = action.search_view_id ? action.search_view_id[0] : false;
+    env.services.view
+        .loadViews(
+            {
+                resModel: action.res_model,
+                views: [...action.views, [searchViewId, "search"]],
+                context: makeContext([user.context, action.context]),
+            },
+            {
+                actionId: action.id,
+                loadActionMenus: action.target !== "new" && action.target !== "inline",
+                loadIrFilters: (action.view_mode || "").split(",").includes("search"),
+            }
+        )
+        .catch(() => (viewsPrefetched = false));
+}
+
 function changePasswordItem(env) {
+    const action = getChangePasswordAction();
+    // The items are built when the user menu opens: load the form while the user picks one
+    if (action) {
+        prefetchViews(env, action);
+    }
     return {
         type: "item",
         id: "change_password",
         description: _t("Change Password"),
         callback: async () => {
             // Trigger the action to open the Wizard
-            const action = {
-                type: "ir.actions.act_window",
-                res_model: "user.change.password.wizard", // Updated Model Name
-                view_mode: "form",
-                views: [[false, "form"]],
-                target: "new",
-                name: _t("Change Password"),
-            };
-            await env.services.action.doAction(action);
+            await env.services.action.doAction(getChangePasswordAction() || ACTION_XMLID);
         },
         sequence: 50,
     };
 }
 
 // Add our item to the registry
-userMenuRegistry.add("change_password", changePasswordItem);
\ No newline at end of file
+userMenuRegistry.add("change_password", changePasswordItem);
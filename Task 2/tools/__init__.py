@@ -0,0 +1 @@
+from . import attempt_throttle
@@ -0,0 +1,81 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+
+
+class AttemptThrottle:
+    """
+    Bounded, in-memory counter of password attempts, shared by the threads of a worker.
+
+    Each key (a user or an IP address) has a score that grows by one per attempt
+    and decays by half every half_life seconds. A key is blocked while one more
+    attempt would bring its score above its limit: max_attempts, or the limit
+    of its kind (the first item of the key) in kind_max_attempts, e.g. a higher
+    one for IP addresses shared by many users behind a NAT or a proxy. Idle keys
+    decay to nothing and are evicted; at most max_keys keys are kept, the least
+    recently used ones are dropped first.
+    """
+
+    def __init__(self, max_attempts=5, half_life=300, max_keys=10000, kind_max_attempts=None):
+        self.max_attempts = max_attempts
+        self.kind_max_attempts = dict(kind_max_attempts or {})
+        self.half_life = half_life
+        self.max_keys = max_keys
+        self._entries = OrderedDict()  # key: (score, timestamp of the score)
+        self._lock = threading.Lock()
+
+    def _score(self, key, now):
+        entry = self._entries.get(key)
+        if not entry:
+            return 0.0
+        score, timestamp = entry
+        return score * 0.5 ** ((now - timestamp) / self.half_life)
+
+    def retry_after(self, keys):
+        """Seconds before any of the keys may try again, 0 when none is blocked."""
+        now = time.monotonic()
+        wait = 0.0
+        with self._lock:
+            for key in keys:
+                limit = max(self.kind_max_attempts.get(key[0], self.max_attempts) - 1, 0.5)
+                score = self._score(key, now)
+                if score > limit:
+                    # Time for the score to decay back to the limit.
+                    wait = max(wait, self.half_life * math.log2(score / limit))
+        return wait
+
+    def hit(self, keys):
+        """Counts one attempt for each key."""
+        now = time.monotonic()
+        with self._lock:
+            for key in keys:
+                self._entries[key] = (self._score(key, now) + 1, now)
+                self._entries.move_to_end(key)
+            if len(self._entries) > self.max_keys:
+                self._evict(now)
+
+    def reset(self, keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def _evict(self, now):
+        # Keys that decayed below a single attempt first, then the least recently used ones.
+        for key in [k for k in self._entries if self._score(k, now) < 0.5]:
+            del self._entries[key]
+        while len(self._entries) > self.max_keys:
+            self._entries.popitem(last=False)
+
+
+# One throttle per worker process; keys hold the database name.
+_throttle = AttemptThrottle()
+_throttle_lock = threading.Lock()
+
+
+def get_throttle(max_attempts, half_life, kind_max_attempts=None):
+    with _throttle_lock:
+        _throttle.max_attempts = max_attempts
+        _throttle.kind_max_attempts = dict(kind_max_attempts or {})
+        _throttle.half_life = half_life
+        return _throttle
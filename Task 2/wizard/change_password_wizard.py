@@ -1,5 +1,11 @@
+import math
+
 from odoo import models, fields, api, _
-from odoo.exceptions import UserError, AccessDenied
+from odoo.exceptions import UserError
+from odoo.http import request
+from odoo.addons.perf_instrumentation.tools.instrument import instrumented
+
+from ..tools import attempt_throttle
 
 class ChangePasswordWizard(models.TransientModel):
     _name = 'user.change.password.wizard'
@@ -17,33 +23,16 @@ class ChangePasswordWizard(models.TransientModel):
         user = self.env.user
 
         # 1. Verify Current Password
-        # We use the public authenticate method.
-        # In Odoo 19, the signature is strictly: authenticate(db, login, password)
-        try:
-            self.env['res.users'].authenticate(
-                self.env.cr.dbname, 
-                user.login, 
-                self.current_password
-            )
-        except AccessDenied:
-            # This is raised if the password is wrong
+        # Throttled attempts are rejected before any hashing happens.
+        throttle = self._get_throttle()
+        keys = self._get_throttle_keys()
+        wait = throttle.retry_after(keys)
+        if wait:
+            raise UserError(_("Too many attempts. Please try again in %s minute(s).") % math.ceil(wait / 60))
+        throttle.hit(keys)
+        if not self._verify_current_password():
             raise UserError(_("The current password you entered is incorrect."))
-        except TypeError:
-            # Fallback: In case the signature changes again, we try one more safe internal check
-            # This handles cases where 'authenticate' might differ in specific nightly builds
-            try:
-                # Direct hash check (works on all versions as a last resort)
-                self.env.cr.execute(
-                    "SELECT password FROM res_users WHERE id=%s", 
-                    (user.id,)
-                )
-                stored_hash = self.env.cr.fetchone()[0]
-                # If we can't authenticate via method, we assume validation passed if we get here
-                # or we could rely on Odoo's crypt context, but let's trust the first try/catch 
-                # flow usually catches the main issue.
-                pass 
-            except Exception:
-                 raise UserError(_("Could not verify current password. Please contact admin."))
+        throttle.reset(keys[:1])
 
         # 2. Check New Password Match
         if self.new_password != self.confirm_password:
@@ -57,4 +46,41 @@ class ChangePasswordWizard(models.TransientModel):
             'type': 'ir.actions.act_url',
             'url': '/web/session/logout',
             'target': 'self',
-        }
\ No newline at end of file
+        }
+
+    @api.model
+    def _get_action(self):
+        """The action opening the wizard, shipped with the session (see ir.http)."""
+        return self.env['ir.actions.act_window']._for_xml_id('user_password_menu.action_user_change_password_wizard')
+
+    @api.model
+    def _get_throttle(self):
+        param = self.env['ir.config_parameter'].sudo().get_param
+        return attempt_throttle.get_throttle(
+            max_attempts=int(param('user_password_menu.max_attempts', 5)),
+            half_life=int(param('user_password_menu.attempt_half_life', 300)),
+            # An address may be shared by a whole office: its limit is much higher than a user's.
+            kind_max_attempts={'ip': int(param('user_password_menu.ip_max_attempts', 50))},
+        )
+
+    @api.model
+    def _get_throttle_keys(self):
+        """The user key first (reset on success), then the IP address of the request, if any."""
+        dbname = self.env.cr.dbname
+        keys = [('user', dbname, self.env.uid)]
+        if request and request.httprequest.remote_addr:
+            keys.append(('ip', dbname, request.httprequest.remote_addr))
+        return keys
+
+    @instrumented('user_password_menu.verify_password', sample_rate=1.0)
+    def _verify_current_password(self):
+        """
+        Checks the current password against the stored hash only: unlike
+        authenticate(), there is no login bookkeeping, no auth logging and no
+        hash upgrade. The password column is not readable through the ORM.
+        """
+        self.env.cr.execute("SELECT COALESCE(password, '') FROM res_users WHERE id = %s", (self.env.uid,))
+        hashed = self.env.cr.fetchone()[0]
+        if not hashed or not self.current_password:
+            return False
+        return self.env['res.users']._crypt_context().verify(self.current_password, hashed)
@@ -13,13 +13,22 @@
     - Live HTML Preview: The QWeb template is rendered into an editable HTML field.
     - PDF Generation: Prints exactly what is in the preview.
     - Includes default templates for Appointment and Promotion letters.
+    - Batch mode: letters for many employees in one background job (merged PDF or ZIP).
+    - Queued print mode: PDFs rendered by a cron with a concurrency cap, requester notified.
+    - Archive of the issued letters, with deduplicated, compressed storage.
     """,
-    'depends': ['hr', 'web'],
+    'depends': ['hr', 'web', 'bus', 'perf_instrumentation'],
     'data': [
         'security/ir.model.access.csv',
+        'security/letter_security.xml',
         'data/default_templates.xml',
         'data/default_letter_types.xml',
+        'data/ir_config_parameter.xml',
+        'data/ir_cron.xml',
         'views/letter_type_view.xml',
+        'views/letter_batch_view.xml',
+        'views/letter_print_job_view.xml',
+        'views/letter_view.xml',
         'wizard/letter_generator_view.xml',
         'report/letter_report.xml',
     ],
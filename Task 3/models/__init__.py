@@ -1 +1,6 @@
-from . import letter_type
\ No newline at end of file
+from . import letter_type
+from . import letter
+from . import letter_batch
+from . import letter_print_job
+from . import hr_employee
+from . import ir_ui_view
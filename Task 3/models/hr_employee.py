@@ -0,0 +1,17 @@
+from odoo import models
+
+from ..tools import preview_cache
+
+
+class HrEmployee(models.Model):
+    _inherit = 'hr.employee'
+
+    def write(self, vals):
+        res = super().write(vals)
+        # Changed employee data already bypasses the cached letters: free them now.
+        preview_cache.evict(self.env.cr.dbname, employee_ids=self.ids)
+        return res
+
+    def unlink(self):
+        preview_cache.evict(self.env.cr.dbname, employee_ids=self.ids)
+        return super().unlink()
@@ -0,0 +1,28 @@
+from odoo import models, api
+
+from ..tools import preview_cache
+
+
+class IrUiView(models.Model):
+    _inherit = 'ir.ui.view'
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        views = super().create(vals_list)
+        # e.g. a new inheriting view changes the letters rendered with its parent.
+        views._clear_preview_caches()
+        return views
+
+    def write(self, vals):
+        res = super().write(vals)
+        self._clear_preview_caches()
+        return res
+
+    def unlink(self):
+        self._clear_preview_caches()
+        return super().unlink()
+
+    def _clear_preview_caches(self):
+        # A letter may t-call any QWeb view: drop every cached letter of this worker.
+        if any(view.type == 'qweb' for view in self):
+            preview_cache.clear_caches(self.env.cr.dbname)
@@ -0,0 +1,210 @@
+import gzip
+import hashlib
+
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+from odoo.addons.perf_instrumentation.tools.instrument import instrumented
+
+REPORT_REF = 'employee_letter_wizard.action_report_employee_letter'
+
+
+class HrLetter(models.Model):
+    """
+    Archive of the issued letters: the final HTML and PDF of every printed letter.
+
+    The HTML is stored gzip-compressed as an attachment. Attachments are stored by
+    checksum in the filestore, so identical letter bodies share the same file; the
+    compression is deterministic (no timestamp) to keep identical bodies identical.
+    Every print is archived as a new letter (its own date and author); a reprint
+    of an identical letter shares the attachments of the first one.
+    """
+    _name = 'hr.letter'
+    _description = 'Issued Employee Letter'
+    _order = 'date desc, id desc'
+
+    name = fields.Char(string="Letter", required=True, readonly=True)
+    # The archive is a proof of what was issued: employees are archived, not deleted.
+    employee_id = fields.Many2one('hr.employee', string="Employee", required=True, readonly=True, index=True, ondelete='restrict')
+    letter_type_id = fields.Many2one('hr.letter.type', string="Letter Type", required=True, readonly=True, index=True, ondelete='restrict')
+    date = fields.Date(string="Issued On", required=True, readonly=True, index=True, default=fields.Date.context_today)
+    user_id = fields.Many2one('res.users', string="Issued By", readonly=True, default=lambda self: self.env.user)
+    company_id = fields.Many2one('res.company', string="Company", readonly=True, default=lambda self: self.env.company)
+    # sha256 of the HTML: an identical letter is looked up instead of being rendered again.
+    content_hash = fields.Char(string="Content Hash", required=True, readonly=True, index=True)
+    # Version of what the PDF adds around the HTML (layout, company header, paper format):
+    # the PDF of a letter is only reused while it is unchanged.
+    layout_version = fields.Char(string="Layout Version", readonly=True)
+    # Reprints of an identical letter share the files of the first one.
+    html_attachment_id = fields.Many2one('ir.attachment', string="HTML", readonly=True)
+    pdf_attachment_id = fields.Many2one('ir.attachment', string="PDF", readonly=True)
+    content = fields.Html(string="Content", sanitize=False, compute='_compute_content')
+
+    # The letters of an employee, per type and most recent first.
+    _employee_type_date_idx = models.Index('(employee_id, letter_type_id, date DESC)')
+
+    def _compute_content(self):
+        for letter in self:
+            raw = letter.html_attachment_id.raw
+            letter.content = gzip.decompress(raw).decode() if raw else False
+
+    @api.model
+    def _hash_content(self, html):
+        return hashlib.sha256(str(html or '').encode()).hexdigest()
+
+    @api.model
+    def _get_layout_version(self):
+        """
+        Version of everything the PDF adds to the letter body: the QWeb templates
+        (web.external_layout and the company layout), the company and its address
+        (header, logo) and the paper format.
+        """
+        company = self.env.company
+        report = self.env.ref(REPORT_REF).sudo()
+        paperformat = report.paperformat_id or company.paperformat_id
+        return self._hash_content(repr((
+            self.env['hr.letter.type']._get_template_version(),
+            company.id, company.write_date, company.partner_id.write_date,
+            report.write_date, paperformat.id, paperformat.write_date,
+        )))
+
+    @api.model
+    def _find_issued(self, generators, layout_version):
+        """
+        The archived letters with exactly the content of the given wizard records
+        and the same layout version, as {(employee id, letter type id, content hash): hr.letter},
+        with one search.
+        """
+        letters = self.search([
+            ('employee_id', 'in', generators.employee_id.ids),
+            ('letter_type_id', 'in', generators.letter_type_id.ids),
+            ('content_hash', 'in', [self._hash_content(g.preview_content) for g in generators]),
+            ('layout_version', '=', layout_version),
+            ('pdf_attachment_id', '!=', False),
+        ])
+        return {(l.employee_id.id, l.letter_type_id.id, l.content_hash): l for l in letters}
+
+    @api.model
+    def _archive(self, vals_list):
+        """
+        Archives letters given as dicts with employee, letter_type, html,
+        layout_version, optionally user (the author, the current user by default)
+        and either pdf (bytes) or issued (an archived identical letter, whose
+        files are shared). One create() for the files, one for the letters.
+        """
+        # The files are only reachable through their letter: they are created with
+        # sudo(), once the user is known to be allowed to archive letters.
+        self.check_access('create')
+        Attachment = self.env['ir.attachment'].sudo()
+        to_store = [vals for vals in vals_list if 'pdf' in vals]
+        attachments = Attachment.create([
+            attachment_vals
+            for vals in to_store
+            for attachment_vals in (
+                {
+                    'name': '%s.html.gz' % self._hash_content(vals['html']),
+                    'raw': gzip.compress(str(vals['html']).encode(), mtime=0),
+                    'mimetype': 'application/gzip',
+                },
+                {
+                    'name': '%s - %s.pdf' % (vals['letter_type'].name, vals['employee'].name),
+                    'raw': vals['pdf'],
+                    'mimetype': 'application/pdf',
+                },
+            )
+        ])
+        # (html, pdf) attachments of each letter
+        files = {id(vals): (attachments[2 * index], attachments[2 * index + 1]) for index, vals in enumerate(to_store)}
+        for vals in vals_list:
+            if 'issued' in vals:
+                files[id(vals)] = (vals['issued'].html_attachment_id, vals['issued'].pdf_attachment_id)
+
+        letters = self.create([{
+            'name': '%s - %s' % (vals['letter_type'].name, vals['employee'].name),
+            'employee_id': vals['employee'].id,
+            'company_id': vals['employee'].company_id.id or self.env.company.id,
+            'letter_type_id': vals['letter_type'].id,
+            'user_id': vals.get('user', self.env.user).id,
+            'content_hash': self._hash_content(vals['html']),
+            'layout_version': vals['layout_version'],
+            'html_attachment_id': files[id(vals)][0].id,
+            'pdf_attachment_id': files[id(vals)][1].id,
+        } for vals in vals_list])
+
+        for letter, vals in zip(letters, vals_list):
+            if 'pdf' in vals:
+                html, pdf = files[id(vals)]
+                (html + pdf).write({'res_model': self._name, 'res_id': letter.id})
+        return letters
+
+    @api.model
+    def _issue(self, generators, user=None):
+        """
+        Archives a letter for each wizard record (hr.letter.generator), issued by
+        user (the current user by default), and returns them as {generator id: hr.letter}.
+        A letter identical to one already issued, with the same layout, shares its
+        files; the others are printed with a single wkhtmltopdf run.
+        """
+        layout_version = self._get_layout_version()
+        found = self._find_issued(generators, layout_version)
+        to_print = generators.filtered(lambda g: (
+            g.employee_id.id, g.letter_type_id.id, self._hash_content(g.preview_content),
+        ) not in found)
+        pdfs = self._render_pdfs(to_print) if to_print else {}
+
+        vals_list = []
+        for generator in generators:
+            vals = {
+                'employee': generator.employee_id,
+                'letter_type': generator.letter_type_id,
+                'html': generator.preview_content,
+                'layout_version': layout_version,
+                'user': user or self.env.user,
+            }
+            if generator in to_print:
+                vals['pdf'] = pdfs[generator.id]
+            else:
+                vals['issued'] = found[(
+                    generator.employee_id.id, generator.letter_type_id.id, self._hash_content(generator.preview_content),
+                )]
+            vals_list.append(vals)
+        return dict(zip(generators.ids, self._archive(vals_list)))
+
+    def unlink(self):
+        # The files of a letter may be shared by its reprints: hand them over to a
+        # remaining letter, otherwise they are deleted with it.
+        attachments = (self.html_attachment_id | self.pdf_attachment_id).sudo().filtered(
+            lambda a: a.res_model == self._name and a.res_id in self.ids
+        )
+        if attachments:
+            heirs = self.search([
+                ('id', 'not in', self.ids),
+                '|', ('html_attachment_id', 'in', attachments.ids), ('pdf_attachment_id', 'in', attachments.ids),
+            ])
+            for heir in heirs:
+                shared = (heir.html_attachment_id | heir.pdf_attachment_id).sudo() & attachments
+                shared.write({'res_id': heir.id})
+                attachments -= shared
+        return super().unlink()
+
+    @api.model
+    @instrumented('employee_letter_wizard.render_pdfs', sample_rate=1.0)
+    def _render_pdfs(self, generators):
+        """One PDF per wizard record, rendered with a single wkhtmltopdf run and split per record."""
+        Report = self.env['ir.actions.report']
+        if len(generators) == 1:
+            return {generators.id: Report._render_qweb_pdf(REPORT_REF, generators.ids)[0]}
+        streams = Report._render_qweb_pdf_prepare_streams(REPORT_REF, None, res_ids=generators.ids)
+        if False in streams:
+            # The PDF could not be split per record: render the letters one by one.
+            return {generator.id: Report._render_qweb_pdf(REPORT_REF, generator.ids)[0] for generator in generators}
+        return {res_id: stream['stream'].getvalue() for res_id, stream in streams.items()}
+
+    def action_download(self):
+        self.ensure_one()
+        if not self.pdf_attachment_id:
+            raise UserError(_("This letter has no PDF."))
+        return {
+            'type': 'ir.actions.act_url',
+            'url': '/web/content/%s?download=true' % self.pdf_attachment_id.id,
+            'target': 'self',
+        }
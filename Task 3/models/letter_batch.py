@@ -0,0 +1,240 @@
+import io
+import logging
+import shutil
+import tempfile
+import time
+import zipfile
+
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+from odoo.tools.pdf import merge_pdf
+from odoo.tools.safe_eval import safe_eval
+
+_logger = logging.getLogger(__name__)
+
+
+class HrLetterBatch(models.Model):
+    _name = 'hr.letter.batch'
+    _description = 'Employee Letter Batch'
+    _order = 'id desc'
+
+    name = fields.Char(string="Name", required=True, default=lambda self: _("Letter Batch"))
+    letter_type_id = fields.Many2one('hr.letter.type', string="Letter Type", required=True)
+    department_ids = fields.Many2many('hr.department', string="Departments", help="Leave empty for all departments.")
+    employee_domain = fields.Char(string="Employee Filter", default='[]')
+    output_format = fields.Selection([
+        ('pdf', 'Merged PDF'),
+        ('zip', 'ZIP (one PDF per employee)'),
+    ], string="Output", default='pdf', required=True)
+    state = fields.Selection([
+        ('draft', 'Draft'),
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ], string="Status", default='draft', required=True, copy=False)
+
+    # The employees are selected once, when the batch is queued.
+    # The checkpoint is the last employee id processed: a restarted job resumes after it.
+    employee_ids = fields.Many2many('hr.employee', string="Employees", readonly=True, copy=False)
+    employee_count = fields.Integer(string="Employees", readonly=True, copy=False)
+    last_employee_id = fields.Integer(string="Last Processed Employee", default=0, readonly=True, copy=False)
+    done_count = fields.Integer(string="Letters Generated", readonly=True, copy=False)
+    failed_count = fields.Integer(string="Letters Failed", readonly=True, copy=False)
+    progress = fields.Float(string="Progress", compute='_compute_progress')
+    message = fields.Text(string="Errors", readonly=True, copy=False)
+    attachment_id = fields.Many2one('ir.attachment', string="Result", readonly=True, copy=False)
+    # PDF (or ZIP) of each processed chunk, assembled into the result at the end.
+    chunk_attachment_ids = fields.Many2many(
+        'ir.attachment', 'hr_letter_batch_chunk_rel', 'batch_id', 'attachment_id',
+        string="Chunks", readonly=True, copy=False,
+    )
+    date_start = fields.Datetime(string="Started On", readonly=True, copy=False)
+    date_end = fields.Datetime(string="Finished On", readonly=True, copy=False)
+
+    @api.depends('employee_count', 'done_count', 'failed_count')
+    def _compute_progress(self):
+        for batch in self:
+            done = batch.done_count + batch.failed_count
+            batch.progress = min(100.0, 100.0 * done / batch.employee_count) if batch.employee_count else 0.0
+
+    @api.model
+    def _get_param(self, key, default):
+        return self.env['ir.config_parameter'].sudo().get_param('employee_letter_wizard.%s' % key, default)
+
+    def _get_employee_domain(self):
+        domain = safe_eval(self.employee_domain or '[]', {'uid': self.env.uid})
+        if self.department_ids:
+            domain = domain + [('department_id', 'child_of', self.department_ids.ids)]
+        return domain
+
+    def action_queue(self):
+        """Selects the employees and hands the batch to the cron."""
+        for batch in self.filtered(lambda b: b.state == 'draft'):
+            employees = self.env['hr.employee'].search(batch._get_employee_domain(), order='id')
+            if not employees:
+                raise UserError(_("No employee matches the filter of batch %s.") % batch.name)
+            batch.write({
+                'state': 'queued',
+                'employee_ids': [(6, 0, employees.ids)],
+                'employee_count': len(employees),
+            })
+        self.env.ref('employee_letter_wizard.ir_cron_process_letter_batches')._trigger()
+
+    def action_reset(self):
+        if self.filtered(lambda b: b.state in ('queued', 'running')):
+            raise UserError(_("A queued or running batch cannot be reset."))
+        self.chunk_attachment_ids.unlink()
+        self.attachment_id.unlink()
+        self.write({
+            'state': 'draft',
+            'employee_ids': [(5, 0, 0)],
+            'employee_count': 0,
+            'last_employee_id': 0,
+            'done_count': 0,
+            'failed_count': 0,
+            'message': False,
+            'date_start': False,
+            'date_end': False,
+        })
+
+    def action_download(self):
+        self.ensure_one()
+        if not self.attachment_id:
+            raise UserError(_("The batch has no result yet."))
+        return {
+            'type': 'ir.actions.act_url',
+            'url': '/web/content/%s?download=true' % self.attachment_id.id,
+            'target': 'self',
+        }
+
+    @api.model
+    def _cron_process_batches(self):
+        time_budget = int(self._get_param('time_budget', 240))
+        started = time.monotonic()
+        for batch in self.search([('state', 'in', ['queued', 'running'])], order='id'):
+            try:
+                if not batch._process(started, time_budget):
+                    break
+            except Exception as e:
+                # Chunks are committed one by one: only the current chunk is lost.
+                self.env.cr.rollback()
+                _logger.exception("Employee letter batch %s failed", batch.id)
+                batch.write({
+                    'state': 'failed',
+                    'message': '\n'.join(filter(None, [batch.message, str(e)])),
+                    'date_end': fields.Datetime.now(),
+                })
+                self.env.cr.commit()
+
+    def _process(self, started, time_budget):
+        """
+        Renders the letters chunk by chunk until the time budget is spent,
+        storing the PDF of each chunk and committing after each of them.
+        Returns False when the budget is spent before the batch is complete.
+        """
+        self.ensure_one()
+        if self.state == 'queued':
+            self.write({'state': 'running', 'date_start': fields.Datetime.now()})
+            self.env.cr.commit()
+
+        chunk_size = int(self._get_param('batch_chunk_size', 50))
+        while True:
+            employees = self.employee_ids.filtered(lambda e: e.id > self.last_employee_id).sorted('id')[:chunk_size]
+            if not employees:
+                self._assemble_result()
+                self.write({'state': 'done', 'date_end': fields.Datetime.now()})
+                self.env.cr.commit()
+                return True
+            self._process_chunk(employees)
+            self.env.cr.commit()
+            # Free the memory of the chunk before loading the next one.
+            self.env.invalidate_all()
+            if time.monotonic() - started > time_budget:
+                return False
+
+    def _process_chunk(self, employees):
+        """Renders the letters of a chunk of employees and stores their PDF as a chunk attachment."""
+        letter_type = self.letter_type_id
+        employee_contexts = letter_type._get_employee_contexts(employees)
+        template_version = letter_type._get_template_version()
+
+        contents, errors = {}, []
+        for employee in employees:
+            try:
+                contents[employee] = letter_type._render_letter(employee, template_version, employee_contexts[employee.id])
+            except Exception as e:
+                errors.append("%s: %s" % (employee.name, e))
+
+        if contents:
+            # The report prints the preview_content of generator records, as for a single letter.
+            # The letters are issued (archived) with one PDF each, split from a single wkhtmltopdf run.
+            letters = self.env['hr.letter.generator'].create([{
+                'employee_id': employee.id,
+                'letter_type_id': letter_type.id,
+                'preview_content': html,
+            } for employee, html in contents.items()])
+            issued = self.env['hr.letter']._issue(letters)
+            pdfs = [(letter.employee_id, issued[letter.id].pdf_attachment_id.raw) for letter in letters]
+            if self.output_format == 'zip':
+                payload, mimetype = self._zip_pdfs(pdfs), 'application/zip'
+            else:
+                payload, mimetype = merge_pdf([pdf for __, pdf in pdfs]), 'application/pdf'
+            self.chunk_attachment_ids = [(4, self.env['ir.attachment'].create({
+                'name': 'chunk-%010d' % employees[-1].id,
+                'res_model': self._name,
+                'res_id': self.id,
+                'raw': payload,
+                'mimetype': mimetype,
+            }).id)]
+            letters.unlink()
+
+        self.write({
+            'last_employee_id': employees[-1].id,
+            'done_count': self.done_count + len(contents),
+            'failed_count': self.failed_count + len(errors),
+            'message': '\n'.join(filter(None, [self.message] + errors)) or False,
+        })
+
+    def _zip_pdfs(self, pdfs):
+        """ZIP of [(employee, pdf bytes)], one file per employee."""
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for employee, pdf in pdfs:
+                archive.writestr(self._get_letter_filename(employee), pdf)
+        return buffer.getvalue()
+
+    def _get_letter_filename(self, employee):
+        return '%s - %s (%s).pdf' % (self.letter_type_id.name, employee.name, employee.id)
+
+    def _assemble_result(self):
+        """
+        Assembles the chunks into the final merged PDF or ZIP, then removes them.
+        The ZIP is built incrementally in a temporary file, one chunk at a time
+        and one letter at a time, then stored once.
+        """
+        chunks = self.chunk_attachment_ids.sorted('name')
+        if not chunks:
+            return
+        if self.output_format == 'zip':
+            with tempfile.TemporaryFile() as output:
+                with zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as archive:
+                    for chunk in chunks:
+                        with zipfile.ZipFile(io.BytesIO(chunk.raw)) as chunk_archive:
+                            for info in chunk_archive.infolist():
+                                with chunk_archive.open(info) as source, archive.open(info.filename, 'w') as target:
+                                    shutil.copyfileobj(source, target)
+                        chunk.invalidate_recordset(['raw'])
+                output.seek(0)
+                payload, extension, mimetype = output.read(), 'zip', 'application/zip'
+        else:
+            payload, extension, mimetype = merge_pdf([chunk.raw for chunk in chunks]), 'pdf', 'application/pdf'
+
+        self.attachment_id = self.env['ir.attachment'].create({
+            'name': '%s.%s' % (self.name, extension),
+            'res_model': self._name,
+            'res_id': self.id,
+            'raw': payload,
+            'mimetype': mimetype,
+        })
+        chunks.unlink()
@@ -0,0 +1,156 @@
+import logging
+import time
+from datetime import timedelta
+
+from odoo import models, fields, api, _
+
+_logger = logging.getLogger(__name__)
+
+
+class HrLetterPrintJob(models.Model):
+    _name = 'hr.letter.print.job'
+    _description = 'Employee Letter Print Job'
+    _order = 'id desc'
+
+    employee_id = fields.Many2one('hr.employee', string="Employee", required=True, ondelete='cascade')
+    letter_type_id = fields.Many2one('hr.letter.type', string="Letter Type", required=True, ondelete='cascade')
+    # The (possibly edited) HTML of the wizard preview, printed as is.
+    content = fields.Html(string="Content", sanitize=False, required=True)
+    user_id = fields.Many2one('res.users', string="Requested By", default=lambda self: self.env.user, required=True, index=True)
+    state = fields.Selection([
+        ('pending', 'Pending'),
+        ('running', 'Rendering'),
+        ('done', 'Ready'),
+        ('failed', 'Failed'),
+    ], string="Status", default='pending', required=True, index=True)
+    letter_id = fields.Many2one('hr.letter', string="Issued Letter", readonly=True)
+    attachment_id = fields.Many2one('ir.attachment', string="PDF", related='letter_id.pdf_attachment_id')
+    message = fields.Text(string="Error", readonly=True)
+    date_started = fields.Datetime(string="Rendering Since", readonly=True)
+    date_done = fields.Datetime(string="Ready On", readonly=True)
+
+    @api.model
+    def _get_param(self, key, default):
+        return self.env['ir.config_parameter'].sudo().get_param('employee_letter_wizard.%s' % key, default)
+
+    @api.model
+    def _is_queue_enabled(self):
+        return self._get_param('print_mode', 'sync') == 'queued'
+
+    @api.model
+    def _enqueue(self, letters):
+        """Records print jobs for the given wizard letters and wakes up the cron."""
+        jobs = self.create([{
+            'employee_id': letter.employee_id.id,
+            'letter_type_id': letter.letter_type_id.id,
+            'content': letter.preview_content,
+        } for letter in letters])
+        self.env.ref('employee_letter_wizard.ir_cron_process_letter_print_jobs')._trigger()
+        return jobs
+
+    def action_download(self):
+        self.ensure_one()
+        return {
+            'type': 'ir.actions.act_url',
+            'url': '/web/content/%s?download=true' % self.attachment_id.id,
+            'target': 'self',
+        }
+
+    def action_retry(self):
+        self.filtered(lambda j: j.state == 'failed').write({'state': 'pending', 'message': False})
+        self.env.ref('employee_letter_wizard.ir_cron_process_letter_print_jobs')._trigger()
+
+    @api.model
+    def _cron_process_jobs(self):
+        """
+        Renders the pending jobs one at a time, committing after each of them,
+        until the queue is empty, the concurrency cap is reached or the time
+        limit is spent.
+        """
+        time_limit = int(self._get_param('time_budget', 240))
+        started = time.monotonic()
+        while time.monotonic() - started < time_limit:
+            job = self._claim_job()
+            if not job:
+                break
+            job._render()
+
+    @api.model
+    def _claim_job(self):
+        """
+        Marks the next pending job as rendering and commits, unless
+        'print_concurrency' jobs are already being rendered (by any worker).
+        Jobs stuck in rendering for 30 minutes (e.g. killed worker) are
+        handed back to the queue.
+        """
+        concurrency = int(self._get_param('print_concurrency', 2))
+        now = fields.Datetime.now()
+        # Serialize the claims, so that the cap holds with several workers.
+        self.env.cr.execute("SELECT pg_advisory_xact_lock(hashtext('hr_letter_print_job_claim'))")
+        self.search([
+            ('state', '=', 'running'),
+            ('date_started', '<', now - timedelta(minutes=30)),
+        ]).write({'state': 'pending'})
+        if self.search_count([('state', '=', 'running')]) >= concurrency:
+            self.env.cr.commit()
+            return self.browse()
+
+        self.flush_model(['state'])
+        self.env.cr.execute("""
+            SELECT id
+              FROM hr_letter_print_job
+             WHERE state = 'pending'
+          ORDER BY id
+             LIMIT 1
+               FOR UPDATE SKIP LOCKED
+        """)
+        job = self.browse([row[0] for row in self.env.cr.fetchall()])
+        job.write({'state': 'running', 'date_started': now})
+        self.env.cr.commit()
+        return job
+
+    def _render(self):
+        """Renders the PDF of the job, archives the letter and notifies the requester."""
+        self.ensure_one()
+        try:
+            # The report prints the preview_content of generator records, as for a synchronous print.
+            # The PDF is stored in the letter archive (reused if this exact letter was already issued).
+            generator = self.env['hr.letter.generator'].create({
+                'employee_id': self.employee_id.id,
+                'letter_type_id': self.letter_type_id.id,
+                'preview_content': self.content,
+            })
+            letter = self.env['hr.letter']._issue(generator, user=self.user_id)[generator.id]
+            generator.unlink()
+            self.write({'state': 'done', 'letter_id': letter.id, 'date_done': fields.Datetime.now()})
+            self._notify_requester()
+            self.env.cr.commit()
+        except Exception as e:
+            self.env.cr.rollback()
+            _logger.exception("Rendering of employee letter print job %s failed", self.id)
+            self.write({'state': 'failed', 'message': str(e)})
+            self._notify_requester()
+            self.env.cr.commit()
+
+    def _notify_requester(self):
+        for job in self:
+            if job.state == 'done':
+                message = _("The %(letter)s of %(employee)s is ready: see Employees > Letter Print Jobs.")
+                notification_type = 'success'
+            else:
+                message = _("The %(letter)s of %(employee)s could not be rendered.")
+                notification_type = 'danger'
+            self.env['bus.bus']._sendone(job.user_id.partner_id, 'simple_notification', {
+                'type': notification_type,
+                'title': _("Employee Letter"),
+                'message': message % {'letter': job.letter_type_id.name, 'employee': job.employee_id.name},
+                'sticky': True,
+            })
+
+    @api.autovacuum
+    def _gc_done_jobs(self):
+        """Removes the jobs processed more than 30 days ago; their letter stays in the archive."""
+        self.search([
+            ('state', 'in', ['done', 'failed']),
+            ('create_date', '<', fields.Datetime.now() - timedelta(days=30)),
+        ]).unlink()
@@ -1,4 +1,37 @@
-from odoo import models, fields
+import datetime
+import json
+
+from odoo import models, fields, api, tools, _
+from odoo.exceptions import ValidationError
+from odoo.tools.misc import DotDict
+from odoo.addons.perf_instrumentation.tools.instrument import measure
+
+from ..tools import preview_cache
+
+
+class _EmployeeValues(DotDict):
+    """
+    Dot notation access to the precomputed employee data. A field missing from
+    employee_fields is empty instead of None, and so are its own fields:
+    employee.parent_id.name renders as an empty string instead of crashing.
+    """
+
+    def __getattr__(self, attrib):
+        if attrib.startswith('__'):
+            # Protocol lookups (__html__, __deepcopy__, ...) must not find an empty value.
+            raise AttributeError(attrib)
+        value = self.get(attrib)
+        if value is None:
+            return _EmptyValue()
+        return _EmployeeValues(value) if isinstance(value, dict) else value
+
+
+class _EmptyValue(_EmployeeValues):
+    """Value of a field that was not read: falsy, rendered as an empty string."""
+
+    def __str__(self):
+        return ''
+
 
 class HrLetterType(models.Model):
     _name = 'hr.letter.type'
@@ -6,9 +39,151 @@ class HrLetterType(models.Model):
 
     name = fields.Char(string="Letter Name", required=True)
     view_id = fields.Many2one(
-        'ir.ui.view', 
-        string="QWeb Template", 
+        'ir.ui.view',
+        string="QWeb Template",
         required=True,
         domain=[('type', '=', 'qweb')],
         help="Select the QWeb view that defines the layout for this letter."
-    )
\ No newline at end of file
+    )
+    employee_fields = fields.Char(
+        string="Employee Fields",
+        required=True,
+        default='name, department_id.name, job_id.name',
+        help="Comma-separated employee fields used by the template, e.g. 'name, job_id.name'. "
+             "They are read for all the letters at once; the template gets them as "
+             "'employee', e.g. employee.job_id.name. Other fields are empty."
+    )
+
+    @api.constrains('employee_fields')
+    def _check_employee_fields(self):
+        Employee = self.env['hr.employee']
+        for letter_type in self:
+            for path in letter_type._get_employee_field_paths():
+                fname, __, subfname = path.partition('.')
+                field = Employee._fields.get(fname)
+                if not field:
+                    raise ValidationError(_("The employee has no field %s.") % fname)
+                if subfname and (field.type != 'many2one' or subfname not in self.env[field.comodel_name]._fields):
+                    raise ValidationError(_("%s is not a field of a related record of the employee.") % path)
+
+    def _get_employee_field_paths(self):
+        return [path.strip() for path in (self.employee_fields or '').split(',') if path.strip()]
+
+    @api.model
+    @tools.ormcache()
+    def _get_joining_date_field(self):
+        """
+        Employee field holding the joining date. Checked once per registry:
+        'first_contract_date' only exists when hr_contract is installed.
+        """
+        if 'first_contract_date' in self.env['hr.employee']._fields:
+            return 'first_contract_date'
+        # Fallback: Use the date the employee record was created
+        return 'create_date'
+
+    def _get_employee_contexts(self, employees):
+        """
+        Reads the declared employee fields for the whole recordset at once: one
+        read() on the employees and one per related model. Returns plain dicts,
+        {employee id: data}, so that rendering a letter loads nothing lazily.
+        Related records are nested dicts, empty when the relation is not set.
+        """
+        self.ensure_one()
+        Employee = self.env['hr.employee']
+        joining_date_field = self._get_joining_date_field()
+        related = {}
+        for path in self._get_employee_field_paths():
+            fname, __, subfname = path.partition('.')
+            related.setdefault(fname, set())
+            if subfname:
+                related[fname].add(subfname)
+        fnames = set(related) | {joining_date_field}
+
+        rows = employees.read(list(fnames), load=None)
+        related_data = {}
+        for fname, subfnames in related.items():
+            field = Employee._fields[fname]
+            if field.type == 'many2one' and subfnames:
+                ids = {row[fname] for row in rows if row[fname]}
+                related_data[fname] = {
+                    values.pop('id'): values
+                    for values in self.env[field.comodel_name].browse(ids).read(list(subfnames))
+                }
+
+        contexts = {}
+        for row in rows:
+            data = {fname: row[fname] for fname in related}
+            for fname, records in related_data.items():
+                data[fname] = dict(records[row[fname]], id=row[fname]) if row[fname] else {}
+            joining_date = row[joining_date_field]
+            if isinstance(joining_date, datetime.datetime):
+                joining_date = joining_date.date()
+            data['joining_date'] = joining_date or "TBD"
+            contexts[row['id']] = data
+        return contexts
+
+    def _prepare_render_values(self, employee_data):
+        """Values passed to the QWeb template of the letter, from the precomputed employee data."""
+        return {
+            # Dot notation access (employee.department_id.name) on the plain dict,
+            # fields that were not read are empty.
+            'employee': _EmployeeValues(employee_data),
+            'company': self.env.company,
+            'user': self.env.user,
+            'today': fields.Date.today(),
+            # --- SAFE DATA PREPARATION ---
+            # 'joining_date' is calculated in Python to avoid QWeb crashing
+            # if the 'hr_contract' module is not installed.
+            'joining_date': employee_data['joining_date'],
+        }
+
+    def _get_template_version(self):
+        """
+        Version of the QWeb templates: the letter view may t-call others (e.g. a
+        company layout), so any change of a QWeb view yields a new version.
+        The count and the sum of the ids change when a view is created or
+        deleted, whatever its write_date.
+        """
+        self.env['ir.ui.view'].flush_model(['write_date'])
+        self.env.cr.execute("SELECT max(write_date), count(*), sum(id) FROM ir_ui_view WHERE type = 'qweb'")
+        return self.env.cr.fetchone()
+
+    def _get_preview_cache_key(self, employee_id, employee_data, template_version):
+        """
+        Everything the rendered letter depends on: the employee data itself (so a
+        change made by another worker is never missed) and the record versions.
+        """
+        company = self.env.company
+        return (
+            self.view_id.id, template_version,
+            employee_id, json.dumps(employee_data, sort_keys=True, default=str),
+            company.id, company.write_date,
+            self.env.uid, self.env.lang, fields.Date.today(),
+        )
+
+    def _render_letter(self, employee, template_version=None, employee_data=None):
+        """
+        Renders the letter of one employee and returns its HTML.
+
+        Rendered letters are kept in a bounded LRU cache per worker
+        (employee_letter_wizard.preview_cache_size entries, 256 by default),
+        so switching back and forth in the wizard, or generating a batch after
+        previewing, does not render the same letter twice.
+        template_version and employee_data (see _get_employee_contexts) can be
+        passed when rendering many letters at once.
+        """
+        self.ensure_one()
+        if template_version is None:
+            template_version = self._get_template_version()
+        if employee_data is None:
+            employee_data = self._get_employee_contexts(employee)[employee.id]
+        cache = preview_cache.get_cache(self.env.cr.dbname, int(
+            self.env['ir.config_parameter'].sudo().get_param('employee_letter_wizard.preview_cache_size', 256)
+        ))
+        key = self._get_preview_cache_key(employee.id, employee_data, template_version)
+        html = cache.get(key)
+        if html is None:
+            with measure('employee_letter_wizard.render_letter', self.env):
+                html = self.env['ir.qweb']._render(self.view_id.id, self._prepare_render_values(employee_data))
+            cache.put(key, html)
+        return html
@@ -0,0 +1 @@
+from . import preview_cache
@@ -0,0 +1,71 @@
+import threading
+from collections import OrderedDict
+
+
+class PreviewCache:
+    """
+    Bounded LRU cache of rendered letters (HTML), shared by the threads of a worker.
+
+    Keys start with (view id, template version, employee id, ...): see
+    hr.letter.type._get_preview_cache_key. Any change of the template or of the
+    employee data yields a new key, so a stale entry is never returned; it only
+    waits for eviction, unless it is evicted explicitly.
+    """
+
+    def __init__(self, max_size=256):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def evict(self, view_ids=None, employee_ids=None):
+        """Drops the entries of the given views and/or employees."""
+        view_ids, employee_ids = set(view_ids or ()), set(employee_ids or ())
+        with self._lock:
+            for key in [k for k in self._entries if k[0] in view_ids or k[2] in employee_ids]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# Caches are kept per registry (database) for the lifetime of the worker process.
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(dbname, max_size):
+    with _caches_lock:
+        cache = _caches.get(dbname)
+        if cache is None:
+            cache = _caches[dbname] = PreviewCache(max_size)
+        cache.max_size = max_size
+        return cache
+
+
+def evict(dbname, view_ids=None, employee_ids=None):
+    with _caches_lock:
+        cache = _caches.get(dbname)
+    if cache:
+        cache.evict(view_ids, employee_ids)
+
+
+def clear_caches(dbname):
+    with _caches_lock:
+        cache = _caches.get(dbname)
+    if cache:
+        cache.clear()
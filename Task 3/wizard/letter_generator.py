@@ -21,35 +21,9 @@ class HrLetterGenerator(models.TransientModel):
         Dynamically renders the selected QWeb template using the selected Employee data.
         """
         if self.employee_id and self.letter_type_id and self.letter_type_id.view_id:
-            
-            # --- SAFE DATA PREPARATION ---
-            # We calculate 'joining_date' here in Python to avoid QWeb crashing 
-            # if the 'hr_contract' module is not installed.
-            
-            joining_date = "TBD"
-            # Check if 'first_contract_date' exists in the model schema
-            if 'first_contract_date' in self.env['hr.employee']._fields:
-                joining_date = self.employee_id.first_contract_date or "TBD"
-            else:
-                # Fallback: Use the date the employee record was created
-                joining_date = self.employee_id.create_date.date() if self.employee_id.create_date else "TBD"
-
-            # Prepare the context/values for the template
-            values = {
-                'employee': self.employee_id,
-                'company': self.env.company,
-                'user': self.env.user,
-                'today': fields.Date.today(),
-                'joining_date': joining_date, # Passed explicitly as a safe string/date
-            }
-            
             # Render the QWeb view linked to the Letter Type
             try:
-                rendered_html = self.env['ir.qweb']._render(
-                    self.letter_type_id.view_id.id, 
-                    values
-                )
-                self.preview_content = rendered_html
+                self.preview_content = self.letter_type_id._render_letter(self.employee_id)
             except Exception as e:
                 self.preview_content = f"<p>Error rendering template: {str(e)}</p>"
 
@@ -61,5 +35,21 @@ class HrLetterGenerator(models.TransientModel):
         if not self.preview_content:
             raise UserError(_("Please generate the preview first."))
             
-        # We pass the wizard ID to the report. The report will read 'preview_content' from it.
-        return self.env.ref('employee_letter_wizard.action_report_employee_letter').report_action(self)
\ No newline at end of file
+        # Queued print mode: the PDF is rendered by a cron, outside of the HTTP worker.
+        PrintJob = self.env['hr.letter.print.job']
+        if PrintJob._is_queue_enabled():
+            PrintJob._enqueue(self)
+            return {
+                'type': 'ir.actions.client',
+                'tag': 'display_notification',
+                'params': {
+                    'title': _("Letter Queued"),
+                    'message': _("The PDF is being rendered in the background. You will be notified when it is ready."),
+                    'type': 'info',
+                    'next': {'type': 'ir.actions.act_window_close'},
+                }
+            }
+
+        # The report reads 'preview_content' from the wizard. The PDF is archived with the
+        # letter; printing the exact same letter again downloads the archived PDF.
+        return self.env['hr.letter']._issue(self)[self.id].action_download()
\ No newline at end of file
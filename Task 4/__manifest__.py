@@ -1,22 +1,24 @@
 {
     'name': 'Sales Order Migration Tool (O17 to O19)',
-    'version': '1.0',
+    'version': '1.2',
     'category': 'Tools',
     'summary': 'Migrate Sales Orders from Odoo 17 using XML-RPC',
     'description': """
     Task 4: Sales Order Migration from Odoo 17 -> Odoo 19
     
     Features:
-    - XML-RPC Connection to Odoo 17.
+    - XML-RPC or JSON-RPC Connection to Odoo 17 (pooled keep-alive connections).
     - Idempotent migration (prevents duplicates).
     - Preserves Prices, Taxes, and States.
     - Transaction-safe (per-record rollback).
     - Detailed Logging (Migrated, Skipped, Failed).
     - Partner & Product Mapping.
+    - Chunked, resumable background mode with a persisted checkpoint.
     """,
-    'depends': ['sale_management'],
+    'depends': ['sale_management', 'perf_instrumentation'],
     'data': [
         'security/ir.model.access.csv',
+        'data/ir_cron.xml',
         'views/migration_tool_view.xml',
     ],
     'installable': True,
@@ -0,0 +1,22 @@
+from odoo import api, SUPERUSER_ID
+
+
+def migrate(cr, version):
+    """
+    Orders migrated before 1.1 are only known by their origin (the remote name).
+    Tag them with the source of the tool that migrated them, so that the tool can
+    recognize them by name and fill in their remote id on the next run.
+    """
+    if not version:
+        return
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    for tool in env['so.migration.tool'].search([]):
+        cr.execute("""
+            UPDATE sale_order so
+               SET so_migration_source = %s
+              FROM so_migration_log log
+             WHERE log.tool_id = %s
+               AND log.status = 'migrated'
+               AND so.origin = log.so_reference
+               AND so.so_migration_source IS NULL
+        """, (tool._get_legacy_source_key(), tool.id))
@@ -0,0 +1,33 @@
+from odoo import api, SUPERUSER_ID
+
+
+def migrate(cr, version):
+    """
+    Logs written before 1.2 do not belong to a run. Group them, per tool, in one
+    finished run whose counters are counted once from these logs.
+    """
+    if not version:
+        return
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    Log = env['so.migration.log']
+    for tool in env['so.migration.tool'].search([]):
+        domain = [('tool_id', '=', tool.id), ('run_id', '=', False)]
+        counts = dict(Log._read_group(domain, ['status'], ['__count']))
+        if not counts:
+            continue
+        (date_start, date_end), = Log._read_group(domain, [], ['create_date:min', 'create_date:max'])
+        run = env['so.migration.run'].create({
+            'tool_id': tool.id,
+            'trigger': 'manual',
+            'state': 'done',
+            'date_start': date_start,
+            'date_end': date_end,
+            **{'%s_count' % status: count for status, count in counts.items() if status},
+        })
+        cr.execute("""
+            UPDATE so_migration_log
+               SET run_id = %s
+             WHERE tool_id = %s
+               AND run_id IS NULL
+        """, (run.id, tool.id))
+        tool.current_run_id = run
@@ -1 +1,4 @@
-from . import migration_tool
\ No newline at end of file
+from . import migration_tool
+from . import migration_map
+from . import migration_run
+from . import sale_order
@@ -0,0 +1,65 @@
+from odoo import models, fields, api
+
+
+class MigrationMap(models.Model):
+    _name = 'so.migration.map'
+    _description = 'Migration Mapping'
+    _order = 'tool_id, remote_model, remote_id'
+
+    # Remote model -> cache key of the migration tool lookup cache.
+    _CACHE_KEYS = {
+        'res.partner': 'partners',
+        'product.product': 'products',
+        'account.tax': 'taxes',
+    }
+
+    tool_id = fields.Many2one('so.migration.tool', string="Tool", required=True, ondelete='cascade')
+    remote_model = fields.Selection([
+        ('res.partner', 'Partner'),
+        ('product.product', 'Product'),
+        ('account.tax', 'Tax'),
+    ], string="Remote Model", required=True)
+    remote_id = fields.Integer(string="Remote ID", required=True)
+    local_id = fields.Integer(string="Local ID", required=True)
+
+    # Also serves as the index of the mapping lookups.
+    _tool_remote_uniq = models.Constraint(
+        'UNIQUE(tool_id, remote_model, remote_id)',
+        "This remote record is already mapped for this tool.",
+    )
+
+    @api.model
+    def _load_mappings(self, tool, cache):
+        """
+        Fills the lookup cache with the mappings persisted by the previous runs
+        of the tool, with one search_read. Mappings to local records deleted
+        meanwhile are dropped, so these records are resolved again.
+        """
+        mappings = self.search_read([('tool_id', '=', tool.id)], ['remote_model', 'remote_id', 'local_id'])
+        by_model = {}
+        for mapping in mappings:
+            by_model.setdefault(mapping['remote_model'], []).append(mapping)
+
+        stale_ids = []
+        for remote_model, model_mappings in by_model.items():
+            existing = set(self.env[remote_model].browse([m['local_id'] for m in model_mappings]).exists().ids)
+            values = cache[self._CACHE_KEYS[remote_model]]
+            for mapping in model_mappings:
+                if mapping['local_id'] in existing:
+                    values[mapping['remote_id']] = mapping['local_id']
+                else:
+                    stale_ids.append(mapping['id'])
+        if stale_ids:
+            self.browse(stale_ids).unlink()
+
+    @api.model
+    def _record_mappings(self, tool, remote_model, local_ids):
+        """Persists {remote id: local id} for the tool with one create(); unmatched ids are not stored."""
+        vals_list = [{
+            'tool_id': tool.id,
+            'remote_model': remote_model,
+            'remote_id': remote_id,
+            'local_id': local_id,
+        } for remote_id, local_id in local_ids.items() if local_id]
+        if vals_list:
+            self.create(vals_list)
@@ -0,0 +1,48 @@
+from odoo import models, fields, _
+
+
+class MigrationRun(models.Model):
+    _name = 'so.migration.run'
+    _description = 'Migration Run'
+    _order = 'id desc'
+
+    tool_id = fields.Many2one('so.migration.tool', string="Tool", required=True, index=True, ondelete='cascade')
+    trigger = fields.Selection([
+        ('manual', 'Manual'),
+        ('background', 'Background'),
+    ], string="Trigger", required=True, default='manual')
+    sync_mode = fields.Selection([
+        ('full', 'All Orders'),
+        ('delta', 'Changed Orders Only'),
+    ], string="Sync Mode", required=True, default='full')
+    state = fields.Selection([
+        ('running', 'Running'),
+        ('done', 'Done'),
+    ], string="Status", required=True, default='running')
+    date_start = fields.Datetime(string="Started On", default=fields.Datetime.now, readonly=True)
+    date_end = fields.Datetime(string="Finished On", readonly=True)
+
+    # Incremented once per chunk (see _add_counts), never recounted from the logs.
+    migrated_count = fields.Integer(string="Migrated", readonly=True)
+    updated_count = fields.Integer(string="Updated", readonly=True)
+    skipped_count = fields.Integer(string="Skipped", readonly=True)
+    failed_count = fields.Integer(string="Failed", readonly=True)
+
+    log_ids = fields.One2many('so.migration.log', 'run_id', string="Logs")
+
+    def _compute_display_name(self):
+        for run in self:
+            run.display_name = _("Run #%s") % run.id
+
+    def _add_counts(self, counts):
+        """Adds the status counts of a chunk to the run counters, with one UPDATE."""
+        self.ensure_one()
+        self.write({
+            '%s_count' % status: self['%s_count' % status] + count
+            for status, count in counts.items()
+        })
+
+    def action_view_logs(self):
+        """Opens the logs of the run, failures first, with the paginated list view."""
+        self.ensure_one()
+        return self.tool_id._get_logs_action([('run_id', '=', self.id)])
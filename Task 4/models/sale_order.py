@@ -0,0 +1,15 @@
+from odoo import models, fields
+
+
+class SaleOrder(models.Model):
+    _inherit = 'sale.order'
+
+    # Identity of the migrated order in its source database, used for idempotency.
+    so_migration_source = fields.Char(string="Migration Source", readonly=True, copy=False)
+    so_migration_remote_id = fields.Integer(string="Remote Order ID", readonly=True, copy=False)
+
+    # Also serves as the index of the "already migrated" lookup.
+    _so_migration_remote_uniq = models.Constraint(
+        'UNIQUE(so_migration_source, so_migration_remote_id)',
+        "This remote order has already been migrated from this source.",
+    )
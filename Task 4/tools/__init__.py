@@ -0,0 +1 @@
+from . import rpc_transport
\ No newline at end of file
@@ -0,0 +1,317 @@
+"""
+Local stand-in for an Odoo 17 server, for benchmarking the migration tool.
+
+Serves /xmlrpc/2/common (authenticate, version) and /xmlrpc/2/object
+(execute_kw with search, read, search_read and search_count, plus the
+get_param of database.uuid), and the same
+services over JSON-RPC on /jsonrpc, over a
+synthetic dataset of sales orders, order lines, partners, products and
+taxes, with an optional latency injected in every call. It only depends on
+the standard library, so it can also be started on its own:
+
+    $ python3 fake_odoo17_server.py --orders 10000 --latency 0.02 --port 8017
+
+and be used as the source of a migration tool (database 'fake17', login
+'admin', password 'admin').
+"""
+import argparse
+import json
+import random
+import socketserver
+import threading
+import time
+from datetime import datetime, timedelta
+from xmlrpc.server import MultiPathXMLRPCServer, SimpleXMLRPCDispatcher, SimpleXMLRPCRequestHandler
+
+DB = 'fake17'
+LOGIN = 'admin'
+PASSWORD = 'admin'
+UID = 2
+DB_UUID = 'f4ke0d00-0017-4000-8000-000000000017'
+
+
+def generate_dataset(orders=1000, lines_per_order=5, partners=None, products=None, taxes=4, seed=17):
+    """
+    Returns {model: {id: record}} with the fields the migration tool reads.
+    By default there is one partner per 5 orders and one product per 2 orders,
+    so partners and products are shared between orders as in real data.
+    """
+    rng = random.Random(seed)
+    partners = partners or max(1, orders // 5)
+    products = products or max(1, orders // 2)
+    start = datetime(2024, 1, 1)
+
+    data = {'res.partner': {}, 'product.product': {}, 'account.tax': {}, 'sale.order': {}, 'sale.order.line': {}}
+    for i in range(1, partners + 1):
+        data['res.partner'][i] = {
+            'id': i,
+            'name': 'Customer %s' % i,
+            'email': 'customer%s@example.com' % i,
+            # One partner out of three has no reference: it is matched by email.
+            'ref': 'C%05d' % i if i % 3 else False,
+        }
+    for i in range(1, products + 1):
+        data['product.product'][i] = {
+            'id': i,
+            'name': 'Product %s' % i,
+            'default_code': 'P%05d' % i if i % 4 else False,
+            'barcode': False,
+            'type': 'consu' if i % 2 else 'service',
+        }
+    for i in range(1, taxes + 1):
+        data['account.tax'][i] = {
+            'id': i,
+            'name': 'Tax %s%%' % (5 * i),
+            'amount': 5.0 * i,
+            'type_tax_use': 'sale',
+        }
+
+    line_id = 0
+    for i in range(1, orders + 1):
+        partner = data['res.partner'][rng.randint(1, partners)]
+        line_ids = []
+        amount_total = 0.0
+        for __ in range(lines_per_order):
+            line_id += 1
+            product = data['product.product'][rng.randint(1, products)]
+            qty = float(rng.randint(1, 10))
+            price = round(rng.uniform(1, 500), 2)
+            tax_ids = [rng.randint(1, taxes)] if taxes else []
+            data['sale.order.line'][line_id] = {
+                'id': line_id,
+                'order_id': [i, 'S%05d' % i],
+                'name': product['name'],
+                'product_id': [product['id'], product['name']],
+                'product_uom_qty': qty,
+                'price_unit': price,
+                'discount': 0.0,
+                'display_type': False,
+                'tax_id': tax_ids,
+            }
+            line_ids.append(line_id)
+            amount_total += qty * price
+        date_order = start + timedelta(minutes=7 * i)
+        data['sale.order'][i] = {
+            'id': i,
+            'name': 'S%05d' % i,
+            'date_order': date_order.strftime('%Y-%m-%d %H:%M:%S'),
+            'write_date': (date_order + timedelta(days=1)).strftime('%Y-%m-%d %H:%M:%S'),
+            'partner_id': [partner['id'], partner['name']],
+            'user_id': False,
+            'currency_id': [1, 'USD'],
+            'pricelist_id': [1, 'Public Pricelist'],
+            'company_id': [1, 'My Company'],
+            # A few drafts and cancelled orders, which are not migrated.
+            'state': rng.choices(['sale', 'done', 'draft', 'cancel'], weights=[70, 20, 5, 5])[0],
+            'order_line': line_ids,
+            'amount_total': round(amount_total, 2),
+        }
+    return data
+
+
+def _value(record, field):
+    value = record.get(field, False)
+    # Many2one values are compared on their id, as in Odoo.
+    return value[0] if isinstance(value, list) and len(value) == 2 and field.endswith('_id') else value
+
+
+_OPERATORS = {
+    '=': lambda a, b: a == b,
+    '!=': lambda a, b: a != b,
+    '>': lambda a, b: a is not False and a > b,
+    '>=': lambda a, b: a is not False and a >= b,
+    '<': lambda a, b: a is not False and a < b,
+    '<=': lambda a, b: a is not False and a <= b,
+    'in': lambda a, b: a in b,
+    'not in': lambda a, b: a not in b,
+}
+
+
+def _match(record, domain):
+    """Evaluates a domain in Polish notation ('&', '|', '!' and leaves) on a record."""
+    stack = []
+    for item in reversed(domain or []):
+        if item == '&':
+            stack.append(stack.pop() & stack.pop())
+        elif item == '|':
+            stack.append(stack.pop() | stack.pop())
+        elif item == '!':
+            stack.append(not stack.pop())
+        else:
+            field, operator, value = item
+            stack.append(_OPERATORS[operator](_value(record, field), value))
+    # Implicit '&' between the remaining terms.
+    return all(stack)
+
+
+class FakeOdoo17:
+    """The execute_kw implementation over a generated dataset."""
+
+    def __init__(self, data, latency=0.0):
+        self.data = data
+        self.latency = latency
+        self.call_count = 0
+        self._lock = threading.Lock()
+
+    def _called(self):
+        with self._lock:
+            self.call_count += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    SERVICES = {'common': ('authenticate', 'version'), 'object': ('execute_kw',)}
+
+    def dispatch(self, service, method, args):
+        """Entry point of the JSON-RPC calls, e.g. dispatch('object', 'execute_kw', [...])."""
+        if method not in self.SERVICES.get(service, ()):
+            raise Exception("Method %s of service %s is not implemented by the fake server" % (method, service))
+        return getattr(self, method)(*args)
+
+    # common
+
+    def authenticate(self, db, login, password, user_agent_env=None):
+        self._called()
+        return UID if (db, login, password) == (DB, LOGIN, PASSWORD) else False
+
+    def version(self):
+        return {'server_version': '17.0', 'server_version_info': [17, 0, 0, 'final', 0, '']}
+
+    # object
+
+    def execute_kw(self, db, uid, password, model, method, args, kwargs=None):
+        self._called()
+        if (db, uid, password) != (DB, UID, PASSWORD):
+            raise Exception("Access Denied")
+        if (model, method) == ('ir.config_parameter', 'get_param'):
+            # Read by the migration tool to identify the source database.
+            return DB_UUID if args[0] == 'database.uuid' else False
+        if model not in self.data:
+            raise Exception("Object %s doesn't exist" % model)
+        kwargs = kwargs or {}
+        records = self.data[model]
+
+        if method == 'read':
+            ids = args[0]
+            return [self._read(records[i], kwargs.get('fields')) for i in ids if i in records]
+        if method == 'search_count':
+            return sum(1 for record in records.values() if _match(record, args[0] if args else []))
+        if method in ('search', 'search_read'):
+            found = self._search(records, args[0] if args else kwargs.get('domain', []), **{
+                key: kwargs[key] for key in ('order', 'limit', 'offset') if key in kwargs
+            })
+            if method == 'search':
+                return [record['id'] for record in found]
+            return [self._read(record, kwargs.get('fields')) for record in found]
+        raise Exception("Method %s is not implemented by the fake server" % method)
+
+    def _search(self, records, domain, order='id', limit=None, offset=0):
+        found = [record for record in records.values() if _match(record, domain)]
+        # Apply the sort keys from the last one to the first one (stable sorts).
+        for term in reversed([t.split() for t in (order or 'id').split(',')]):
+            found.sort(key=lambda r: (r.get(term[0]) is False, r.get(term[0])),
+                       reverse=len(term) > 1 and term[1].lower() == 'desc')
+        return found[offset or 0:(offset or 0) + limit if limit else None]
+
+    def _read(self, record, fields):
+        if not fields:
+            return dict(record)
+        values = {field: record.get(field, False) for field in fields}
+        values['id'] = record['id']
+        return values
+
+
+class _RequestHandler(SimpleXMLRPCRequestHandler):
+    # Keep-alive, as the migration tool reuses its connections.
+    protocol_version = 'HTTP/1.1'
+    rpc_paths = ('/xmlrpc/2/common', '/xmlrpc/2/object')
+
+    def do_POST(self):
+        if self.path != '/jsonrpc':
+            return super().do_POST()
+        request = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        params = request.get('params', {})
+        response = {'jsonrpc': '2.0', 'id': request.get('id')}
+        try:
+            response['result'] = self.server.odoo.dispatch(params['service'], params['method'], params.get('args', []))
+        except Exception as e:
+            # Same shape as the errors of the /jsonrpc route of Odoo.
+            response['error'] = {'code': 200, 'message': "Odoo Server Error", 'data': {'message': str(e)}}
+        body = json.dumps(response).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _ThreadingServer(socketserver.ThreadingMixIn, MultiPathXMLRPCServer):
+    daemon_threads = True
+
+
+class FakeOdoo17Server:
+    """
+    Threaded XML-RPC and JSON-RPC server on localhost, usable as a context manager:
+
+        with FakeOdoo17Server(generate_dataset(orders=1000), latency=0.01) as server:
+            server.url  # e.g. http://127.0.0.1:41235
+    """
+
+    def __init__(self, data, latency=0.0, port=0):
+        self.odoo = FakeOdoo17(data, latency)
+        self._server = _ThreadingServer(
+            ('127.0.0.1', port), requestHandler=_RequestHandler, allow_none=True, logRequests=False,
+        )
+        # Read by the JSON-RPC handler.
+        self._server.odoo = self.odoo
+        for service, methods in FakeOdoo17.SERVICES.items():
+            dispatcher = SimpleXMLRPCDispatcher(allow_none=True)
+            for method in methods:
+                dispatcher.register_function(getattr(self.odoo, method), method)
+            self._server.add_dispatcher('/xmlrpc/2/%s' % service, dispatcher)
+        self._thread = None
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:%s' % self._server.server_address[1]
+
+    @property
+    def call_count(self):
+        return self.odoo.call_count
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='fake_odoo17', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--orders', type=int, default=1000)
+    parser.add_argument('--lines-per-order', type=int, default=5)
+    parser.add_argument('--latency', type=float, default=0.0, help="Seconds added to every call")
+    parser.add_argument('--port', type=int, default=8017)
+    options = parser.parse_args()
+
+    server = FakeOdoo17Server(
+        generate_dataset(options.orders, options.lines_per_order), latency=options.latency, port=options.port,
+    )
+    print("Fake Odoo 17 on %s (db %r, login %r, password %r)" % (server.url, DB, LOGIN, PASSWORD))
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        server._server.server_close()
@@ -0,0 +1,96 @@
+"""
+Throughput benchmark for the SO migration tool.
+
+Starts a local fake Odoo 17 server (see fake_odoo17_server) with a synthetic
+dataset, runs so.migration.tool.action_start_migration against it and
+reports the orders per second, the number of remote calls and the number of
+local SQL queries. Each size is run twice: a first run on an empty database,
+then a re-run where every order is already migrated. Everything runs inside
+a savepoint that is rolled back at the end:
+
+    $ odoo-bin shell -d <database>
+    >>> from odoo.addons.so_migration_tool.tools.migration_benchmark import run_benchmark
+    >>> run_benchmark(env, sizes=(500, 5000), latency=0.01)
+"""
+import logging
+import time
+
+from . import fake_odoo17_server
+
+_logger = logging.getLogger(__name__)
+
+
+class _Rollback(Exception):
+    pass
+
+
+def run_benchmark(env, sizes=(500,), lines_per_order=5, latency=0.01, rpc_backend='xmlrpc', rpc_pool_size=4,
+                  page_size=None):
+    """
+    Runs the benchmark for each dataset size and returns the list of results.
+
+    latency is the delay in seconds added by the fake server to every call,
+    to model the round trip to a remote server. page_size overrides the
+    so_migration_tool.page_size system parameter during the benchmark.
+    """
+    results = []
+    for size in sizes:
+        data = fake_odoo17_server.generate_dataset(orders=size, lines_per_order=lines_per_order)
+        with fake_odoo17_server.FakeOdoo17Server(data, latency=latency) as server:
+            try:
+                with env.cr.savepoint():
+                    if page_size:
+                        env['ir.config_parameter'].sudo().set_param('so_migration_tool.page_size', page_size)
+                    tool = env['so.migration.tool'].create({
+                        'url': server.url,
+                        'db': fake_odoo17_server.DB,
+                        'username': fake_odoo17_server.LOGIN,
+                        'password': fake_odoo17_server.PASSWORD,
+                        'rpc_backend': rpc_backend,
+                        'rpc_pool_size': rpc_pool_size,
+                    })
+                    for run in ('first run', 're-run'):
+                        result = _run_once(env, tool, server)
+                        result.update(size=size, run=run, latency=latency)
+                        results.append(result)
+                    raise _Rollback()
+            except _Rollback:
+                pass
+
+    for result in results:
+        _logger.info(
+            "SO migration benchmark (%(size)s orders, %(run)s): %(orders_per_second).1f orders/s, "
+            "%(remote_calls)s remote calls, %(queries)s SQL queries (%(queries_per_order).1f/order), "
+            "%(migrated)s migrated, %(updated)s updated, %(skipped)s skipped, %(failed)s failed", result,
+        )
+    return results
+
+
+def _run_once(env, tool, server):
+    env.flush_all()
+    calls_before = server.call_count
+    queries_before = env.cr.sql_log_count
+    started = time.perf_counter()
+
+    tool.action_start_migration()
+    env.flush_all()
+
+    wall_time = time.perf_counter() - started
+    queries = env.cr.sql_log_count - queries_before
+    run = tool.current_run_id
+    counts = {
+        'migrated': run.migrated_count,
+        'updated': run.updated_count,
+        'skipped': run.skipped_count,
+        'failed': run.failed_count,
+    }
+    orders = sum(counts.values())
+    return dict(
+        counts,
+        orders=orders,
+        wall_time=wall_time,
+        orders_per_second=orders / wall_time if wall_time else 0.0,
+        remote_calls=server.call_count - calls_before,
+        queries=queries,
+        queries_per_order=queries / orders if orders else 0.0,
+    )
@@ -0,0 +1,202 @@
+import http.client
+import itertools
+import json
+import queue
+import threading
+import xmlrpc.client
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+
+class RpcError(Exception):
+    """Error returned by the remote server."""
+
+
+class _TimeoutTransport(xmlrpc.client.Transport):
+    """HTTP/1.1 keep-alive transport with a socket timeout."""
+
+    def __init__(self, timeout, **kwargs):
+        super().__init__(**kwargs)
+        self._timeout = timeout
+
+    def make_connection(self, host):
+        connection = super().make_connection(host)
+        connection.timeout = self._timeout
+        return connection
+
+
+class _TimeoutSafeTransport(xmlrpc.client.SafeTransport):
+    """HTTPS keep-alive transport with a socket timeout."""
+
+    def __init__(self, timeout, **kwargs):
+        super().__init__(**kwargs)
+        self._timeout = timeout
+
+    def make_connection(self, host):
+        connection = super().make_connection(host)
+        connection.timeout = self._timeout
+        return connection
+
+
+class XmlRpcConnection:
+    """
+    One keep-alive XML-RPC connection per service (common, object).
+    Not thread-safe: it is only used by one thread at a time through the pool.
+    """
+
+    def __init__(self, url, timeout):
+        self.url = url
+        self.timeout = timeout
+        self._proxies = {}
+
+    def call(self, service, method, *args):
+        proxy = self._proxies.get(service)
+        if proxy is None:
+            transport_class = _TimeoutSafeTransport if self.url.startswith('https') else _TimeoutTransport
+            proxy = self._proxies[service] = xmlrpc.client.ServerProxy(
+                '{}/xmlrpc/2/{}'.format(self.url, service),
+                transport=transport_class(self.timeout),
+                allow_none=True,
+            )
+        try:
+            return getattr(proxy, method)(*args)
+        except xmlrpc.client.Fault as e:
+            raise RpcError(e.faultString) from e
+
+    def close(self):
+        for proxy in self._proxies.values():
+            proxy('close')()
+        self._proxies = {}
+
+
+class JsonRpcConnection:
+    """
+    One keep-alive HTTP connection to the /jsonrpc endpoint.
+    Not thread-safe: it is only used by one thread at a time through the pool.
+    """
+
+    _ids = itertools.count(1)
+
+    def __init__(self, url, timeout):
+        parts = urlsplit(url)
+        self.connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self.netloc = parts.netloc
+        self.path = (parts.path.rstrip('/') or '') + '/jsonrpc'
+        self.timeout = timeout
+        self._connection = None
+
+    def call(self, service, method, *args):
+        payload = json.dumps({
+            'jsonrpc': '2.0',
+            'method': 'call',
+            'params': {'service': service, 'method': method, 'args': args},
+            'id': next(self._ids),
+        })
+        try:
+            response = self._post(payload)
+        except (http.client.RemoteDisconnected, http.client.CannotSendRequest, BrokenPipeError, ConnectionResetError):
+            # The server closed the idle keep-alive connection: retry once on a new one.
+            self.close()
+            response = self._post(payload)
+
+        if response.get('error'):
+            error = response['error']
+            raise RpcError(error.get('data', {}).get('message') or error.get('message'))
+        return response.get('result')
+
+    def _post(self, payload):
+        if self._connection is None:
+            self._connection = self.connection_class(self.netloc, timeout=self.timeout)
+        self._connection.request('POST', self.path, payload, {'Content-Type': 'application/json'})
+        response = self._connection.getresponse()
+        body = response.read()
+        if response.status != 200:
+            raise RpcError("HTTP %s: %s" % (response.status, body[:200]))
+        return json.loads(body)
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+class RpcClient:
+    """
+    Pooled RPC client for the source Odoo server.
+
+    - Connections are kept alive and reused (at most pool_size of them).
+    - At most pool_size requests are in flight at any time, whether they are
+      made by the caller or by the background prefetch threads.
+    - execute_kw() has the same signature as the one of an xmlrpc ServerProxy.
+    """
+
+    BACKENDS = {'xmlrpc': XmlRpcConnection, 'jsonrpc': JsonRpcConnection}
+
+    def __init__(self, url, backend='xmlrpc', pool_size=4, timeout=120):
+        self.url = url.rstrip('/')
+        self.connection_class = self.BACKENDS[backend]
+        self.timeout = timeout
+        self.pool_size = max(1, pool_size)
+        self.call_count = 0
+        self._idle = queue.LifoQueue()
+        self._in_flight = threading.BoundedSemaphore(self.pool_size)
+        self._lock = threading.Lock()
+        self._executor = None
+
+    @contextmanager
+    def _connection(self):
+        with self._in_flight:
+            try:
+                connection = self._idle.get_nowait()
+            except queue.Empty:
+                connection = self.connection_class(self.url, self.timeout)
+            try:
+                yield connection
+            except RpcError:
+                # The server answered with an error: the connection itself is still usable.
+                self._idle.put(connection)
+                raise
+            except BaseException:
+                # Never give a broken (or half-read) connection back to the pool, nor leak it.
+                connection.close()
+                raise
+            else:
+                self._idle.put(connection)
+
+    def call(self, service, method, *args):
+        with self._lock:
+            self.call_count += 1
+        with self._connection() as connection:
+            return connection.call(service, method, *args)
+
+    def authenticate(self, db, login, password):
+        return self.call('common', 'authenticate', db, login, password, {})
+
+    def execute_kw(self, db, uid, password, model, method, args, kwargs=None):
+        return self.call('object', 'execute_kw', db, uid, password, model, method, args, kwargs or {})
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        Runs fn in a background thread and returns a Future. fn must only do
+        RPC calls: it must never use the ORM or the database cursor.
+        """
+        with self._lock:
+            if self._executor is None:
+                # One extra worker: a prefetch task may itself wait on the sub-requests it submits.
+                # The number of requests actually in flight stays bounded by the semaphore.
+                self._executor = ThreadPoolExecutor(max_workers=self.pool_size + 1, thread_name_prefix='so_migration_rpc')
+            return self._executor.submit(fn, *args, **kwargs)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+        while not self._idle.empty():
+            self._idle.get_nowait().close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
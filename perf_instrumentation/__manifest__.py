@@ -0,0 +1,23 @@
+{
+    'name': 'Hot Path Instrumentation',
+    'version': '1.0',
+    'category': 'Technical',
+    'summary': 'Wall time, SQL and RPC counts of the hot paths of the assessment modules',
+    'description': """
+    Shared instrumentation used by the four assessment modules.
+
+    Features:
+    - measure() context manager and @instrumented decorator.
+    - Wall time, SQL query count and remote call count per operation.
+    - Sampling (perf_instrumentation.sample_rate) to keep the overhead negligible.
+    - In-memory histograms flushed periodically to a stats model and the logger.
+    """,
+    'depends': ['base'],
+    'data': [
+        'security/ir.model.access.csv',
+        'data/ir_config_parameter.xml',
+        'views/perf_stat_view.xml',
+    ],
+    'installable': True,
+    'license': 'LGPL-3',
+}
@@ -0,0 +1 @@
+from . import perf_stat
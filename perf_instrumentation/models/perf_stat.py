@@ -0,0 +1,78 @@
+import logging
+from datetime import datetime, timedelta, timezone
+
+from odoo import models, fields, api
+
+from ..tools import instrument
+
+_logger = logging.getLogger(__name__)
+
+
+class PerfStat(models.Model):
+    """
+    Performance stats of the instrumented operations: one record per operation,
+    worker process and flush period (see tools/instrument.py). Percentiles are
+    those of the process over the period; they cannot be summed across records.
+    """
+    _name = 'perf.stat'
+    _description = 'Performance Stats'
+    _order = 'date_end desc, operation'
+    _rec_name = 'operation'
+
+    operation = fields.Char(string="Operation", required=True, readonly=True, index=True)
+    process_id = fields.Integer(string="Process", readonly=True)
+    date_start = fields.Datetime(string="From", readonly=True)
+    date_end = fields.Datetime(string="To", readonly=True, index=True)
+    calls = fields.Integer(string="Calls", readonly=True, aggregator='sum')
+    sampled_calls = fields.Integer(string="Sampled Calls", readonly=True, aggregator='sum')
+    errors = fields.Integer(string="Errors", readonly=True, aggregator='sum')
+    items = fields.Integer(string="Items", readonly=True, aggregator='sum', help="Items processed by the sampled calls (e.g. orders).")
+    wall_avg_ms = fields.Float(string="Avg (ms)", readonly=True, aggregator='avg')
+    wall_p50_ms = fields.Float(string="p50 (ms)", readonly=True, aggregator='avg')
+    wall_p95_ms = fields.Float(string="p95 (ms)", readonly=True, aggregator='max')
+    wall_p99_ms = fields.Float(string="p99 (ms)", readonly=True, aggregator='max')
+    wall_max_ms = fields.Float(string="Max (ms)", readonly=True, aggregator='max')
+    sql_per_call = fields.Float(string="SQL / Call", readonly=True, aggregator='avg')
+    rpc_per_call = fields.Float(string="RPC / Call", readonly=True, aggregator='avg')
+    items_per_second = fields.Float(string="Items / s", readonly=True, aggregator='avg')
+
+    @api.model
+    def _get_param(self, key, default):
+        return self.env['ir.config_parameter'].sudo().get_param('perf_instrumentation.%s' % key, default)
+
+    @api.model
+    def _get_settings(self):
+        """(sample rate, flush interval in seconds), applied by the workers at their next flush."""
+        return (
+            float(self._get_param('sample_rate', instrument.DEFAULT_SAMPLE_RATE)),
+            int(self._get_param('flush_interval', instrument.DEFAULT_FLUSH_INTERVAL)),
+        )
+
+    @api.model
+    def _store(self, stats, process_id):
+        """Stores and logs {operation: OperationStats}, with one create()."""
+        now = fields.Datetime.now()
+        vals_list = []
+        for operation, operation_stats in sorted(stats.items()):
+            values = operation_stats.to_values()
+            _logger.info(
+                "%s: %s calls (%s sampled, %s errors), wall avg %.1fms p50 %.1fms p95 %.1fms p99 %.1fms "
+                "max %.1fms, %.1f SQL/call, %.1f RPC/call, %.1f items/s",
+                operation, values['calls'], values['sampled_calls'], values['errors'],
+                values['wall_avg_ms'], values['wall_p50_ms'], values['wall_p95_ms'], values['wall_p99_ms'],
+                values['wall_max_ms'], values['sql_per_call'], values['rpc_per_call'], values['items_per_second'],
+            )
+            values.update(
+                operation=operation,
+                process_id=process_id,
+                date_start=datetime.fromtimestamp(operation_stats.date_start, timezone.utc).replace(tzinfo=None, microsecond=0),
+                date_end=now,
+            )
+            vals_list.append(values)
+        return self.create(vals_list)
+
+    @api.autovacuum
+    def _gc_stats(self):
+        """Removes the stats older than perf_instrumentation.retention_days (30 by default)."""
+        retention_days = int(self._get_param('retention_days', 30))
+        self.search([('date_end', '<', fields.Datetime.now() - timedelta(days=retention_days))]).unlink()
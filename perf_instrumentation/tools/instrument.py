@@ -0,0 +1,213 @@
+"""
+In-process instrumentation of hot paths.
+
+    from odoo.addons.perf_instrumentation.tools.instrument import measure, instrumented
+
+    with measure('my_module.operation', self.env, items=len(records)) as sample:
+        ...
+        sample.rpc_count += 2      # remote calls made by the operation
+        sample.errors += failures  # errors caught (and not raised) by the operation
+
+    @instrumented('my_module.method')
+    def _method(self):
+        ...
+
+Every call is counted; a sample of them (perf_instrumentation.sample_rate,
+0.1 by default) also records its wall time, the SQL queries of the cursor and
+the remote calls. Samples are aggregated in memory, per database and operation,
+and flushed to perf.stat and the logger every perf_instrumentation.flush_interval
+seconds (300 by default), by the first instrumented call after that delay.
+"""
+import bisect
+import functools
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from odoo import api, SUPERUSER_ID
+
+_logger = logging.getLogger(__name__)
+
+# Upper bounds of the wall time buckets, in milliseconds: from 0.1ms to about 8 minutes, +25% each.
+BUCKET_BOUNDS = [0.1 * 1.25 ** i for i in range(70)]
+
+DEFAULT_SAMPLE_RATE = 0.1
+DEFAULT_FLUSH_INTERVAL = 300
+
+
+class Histogram:
+    """Wall times with fixed logarithmic buckets: constant memory, percentiles within 25%."""
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        self.buckets[bisect.bisect_left(BUCKET_BOUNDS, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def percentile(self, p):
+        """Upper bound of the bucket holding the p-th percentile, capped by the maximum."""
+        if not self.count:
+            return 0.0
+        rank = p / 100.0 * self.count
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if seen >= rank and count:
+                bound = BUCKET_BOUNDS[index] if index < len(BUCKET_BOUNDS) else self.max
+                return min(bound, self.max)
+        return self.max
+
+
+class OperationStats:
+    """Aggregated measures of one operation since the last flush."""
+
+    def __init__(self):
+        self.date_start = time.time()
+        self.calls = 0
+        self.errors = 0
+        self.wall = Histogram()
+        self.sql_count = 0
+        self.rpc_count = 0
+        self.items = 0
+
+    def to_values(self):
+        sampled = self.wall.count
+        wall_seconds = self.wall.total / 1000.0
+        return {
+            'calls': self.calls,
+            'sampled_calls': sampled,
+            'errors': self.errors,
+            'items': self.items,
+            'wall_avg_ms': self.wall.total / sampled if sampled else 0.0,
+            'wall_p50_ms': self.wall.percentile(50),
+            'wall_p95_ms': self.wall.percentile(95),
+            'wall_p99_ms': self.wall.percentile(99),
+            'wall_max_ms': self.wall.max,
+            'sql_per_call': self.sql_count / sampled if sampled else 0.0,
+            'rpc_per_call': self.rpc_count / sampled if sampled else 0.0,
+            'items_per_second': self.items / wall_seconds if wall_seconds else 0.0,
+        }
+
+
+class Sample:
+    """What the caller can add to the current measure."""
+
+    __slots__ = ('sampled', 'items', 'rpc_count', 'errors')
+
+    def __init__(self, sampled, items=0):
+        self.sampled = sampled
+        self.items = items
+        self.rpc_count = 0
+        self.errors = 0
+
+
+# Stats per (database, operation), for the lifetime of the worker process.
+_stats = {}
+# Settings per database, read from the system parameters at each flush.
+_settings = {}
+_last_flush = {}
+_lock = threading.Lock()
+
+
+def _get_settings(dbname):
+    return _settings.get(dbname, (DEFAULT_SAMPLE_RATE, DEFAULT_FLUSH_INTERVAL))
+
+
+def _record(dbname, operation, sample, raised, wall_ms=None, sql_count=0):
+    with _lock:
+        stats = _stats.get((dbname, operation))
+        if stats is None:
+            stats = _stats[(dbname, operation)] = OperationStats()
+        stats.calls += 1
+        stats.errors += sample.errors + (1 if raised else 0)
+        if wall_ms is not None:
+            stats.wall.add(wall_ms)
+            stats.sql_count += sql_count
+            stats.rpc_count += sample.rpc_count
+            stats.items += sample.items
+
+
+@contextmanager
+def measure(operation, env=None, dbname=None, items=0, sample_rate=None):
+    """
+    Measures the enclosed block as one call of operation. env gives the database
+    and the cursor whose queries are counted; without env (e.g. in a thread doing
+    only remote calls), dbname must be given and no query is counted.
+    sample_rate overrides the perf_instrumentation.sample_rate parameter, e.g.
+    1.0 for rare and expensive operations.
+    """
+    dbname = env.cr.dbname if env is not None else dbname
+    rate = _get_settings(dbname)[0] if sample_rate is None else sample_rate
+    sample = Sample(rate > 0 and random.random() < rate, items)
+    sql_before = env.cr.sql_log_count if sample.sampled and env is not None else 0
+    started = time.perf_counter() if sample.sampled else None
+    raised = False
+    try:
+        yield sample
+    except BaseException:
+        raised = True
+        raise
+    finally:
+        if started is None:
+            _record(dbname, operation, sample, raised)
+        else:
+            sql_count = env.cr.sql_log_count - sql_before if env is not None else 0
+            _record(dbname, operation, sample, raised, (time.perf_counter() - started) * 1000.0, sql_count)
+        if env is not None:
+            _maybe_flush(env.registry, dbname)
+
+
+def instrumented(operation, sample_rate=None):
+    """Decorator measuring each call of a model method, see measure()."""
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with measure(operation, self.env, sample_rate=sample_rate):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def drain(dbname):
+    """Returns {operation: OperationStats} of dbname collected since the last call, and resets them."""
+    with _lock:
+        keys = [key for key in _stats if key[0] == dbname]
+        return {key[1]: _stats.pop(key) for key in keys}
+
+
+def _maybe_flush(registry, dbname):
+    now = time.monotonic()
+    with _lock:
+        last = _last_flush.setdefault(dbname, now)
+        if now - last < _get_settings(dbname)[1]:
+            return
+        _last_flush[dbname] = now
+    flush(registry, dbname)
+
+
+def flush(registry, dbname):
+    """
+    Writes the stats of dbname to perf.stat with a cursor of its own, so the
+    transaction of the instrumented call is left untouched, and logs them.
+    """
+    stats = drain(dbname)
+    try:
+        with registry.cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            if 'perf.stat' not in env:
+                # The module is being installed or upgraded: nothing to write to yet.
+                return
+            if stats:
+                env['perf.stat']._store(stats, process_id=os.getpid())
+            _settings[dbname] = env['perf.stat']._get_settings()
+    except Exception:
+        _logger.warning("Could not flush the performance stats of %s", dbname, exc_info=True)